@@ -1,34 +1,59 @@
-import argparse
+import argparse, multiprocessing
 from extra.optimization.helpers import ast_str_to_lin
 
 from tinygrad import dtypes
-from tinygrad.helpers import BEAM, getenv
+from tinygrad.helpers import BEAM, getenv, dedup
 from tinygrad.device import Device, Compiled
 from tinygrad.codegen.kernel import Kernel
-from tinygrad.engine.search import time_linearizer, beam_search, bufs_from_lin
+from tinygrad.engine.search import time_linearizer, beam_search, bufs_from_lin, cached_beam_search, export_beam_cache, import_beam_cache
 
+def tune(i:int, cnt:int, ast_str:str):
+  print(f"optimizing {i}/{cnt}\nast={ast_str}")
+  lin = ast_str_to_lin(ast_str, opts=Device[Device.DEFAULT].renderer)
+  rawbufs = bufs_from_lin(lin)
+  lin = beam_search(lin, rawbufs, getenv("BEAM", 8), bool(getenv("BEAM_ESTIMATE", 1)))
+
+  tm = time_linearizer(lin, rawbufs, allow_test_size=False, cnt=10)
+  print(f"final time {tm*1e6:9.0f} us: {lin.colored_shape()}")
+  print(lin.applied_opts)
+
+def tune_worker(todo:multiprocessing.Queue, cnt:int):
+  while (item:=todo.get()) is not None: tune(item[0], cnt, item[1])
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser(description="Run a search for the optimal opts for a kernel", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
   parser.add_argument("--ast", type=str, default=None, help="the ast for the kernel to be optimized")
-  parser.add_argument("--file", type=str, default=None, help="a file containing asts to be optimized, one per line")
+  parser.add_argument("--file", type=str, default=None, help="a file containing asts to be optimized, one per line, like the one LOGOPS writes")
+  parser.add_argument("--workers", type=int, default=1, help="number of processes tuning kernels in parallel")
+  parser.add_argument("--export", type=str, default=None, help="write the tuned opts for this device to a bundle file")
+  parser.add_argument("--import", dest="import_", type=str, default=None, help="load the tuned opts from a bundle file into the cache")
   args = parser.parse_args()
 
   device: Compiled = Device[Device.DEFAULT]
-  print(f"optimizing for {Device.DEFAULT}")
+  if args.import_ is not None: print(f"imported {import_beam_cache(args.import_)} kernels from {args.import_}")
 
+  ast_strs = []
   if args.ast is not None:
     ast_strs = [args.ast]
   elif args.file is not None:
     with open(args.file, 'r') as file:
-     ast_strs = file.readlines()
+      ast_strs = dedup([x.strip() for x in file.readlines() if x.strip()])
+
+  # the beam_search cache is the queue state, kernels tuned by a previous run are skipped
+  amt, allow_test_size = getenv("BEAM", 8), bool(getenv("BEAM_ESTIMATE", 1))
+  todo = [x for x in ast_strs if cached_beam_search(ast_str_to_lin(x, opts=device.renderer), amt, allow_test_size) is None]
+  if ast_strs: print(f"optimizing {len(todo)} of {len(ast_strs)} kernels for {Device.DEFAULT}")
 
-  for i, ast_str in enumerate(ast_strs):
-    print(f"optimizing {i}/{len(ast_strs)}\nast={ast_str}")
-    lin = ast_str_to_lin(ast_str, opts=device.renderer)
-    rawbufs = bufs_from_lin(lin)
-    lin = beam_search(lin, rawbufs, getenv("BEAM", 8), bool(getenv("BEAM_ESTIMATE", 1)))
+  if args.workers > 1 and len(todo) > 1:
+    ctx = multiprocessing.get_context("spawn")
+    q = ctx.Queue()
+    for i,ast_str in enumerate(todo): q.put((i, ast_str))
+    procs = [ctx.Process(target=tune_worker, args=(q, len(todo))) for _ in range(min(args.workers, len(todo)))]
+    for _ in procs: q.put(None)
+    for p in procs: p.start()
+    for p in procs: p.join()
+  else:
+    for i,ast_str in enumerate(todo): tune(i, len(todo), ast_str)
 
-    tm = time_linearizer(lin, rawbufs, allow_test_size=False, cnt=10)
-    print(f"final time {tm*1e6:9.0f} us: {lin.colored_shape()}")
-    print(lin.applied_opts)
+  if args.export is not None:
+    print(f"exported {export_beam_cache(args.export, device.renderer.device, device.renderer.suffix)} kernels to {args.export}")
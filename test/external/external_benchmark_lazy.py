@@ -0,0 +1,59 @@
+import gc, sys, time, tracemalloc
+from extra.models.transformer import Transformer
+from tinygrad import Tensor, dtypes
+from tinygrad.helpers import Context, GlobalCounters, getenv
+from tinygrad.engine.schedule import create_schedule, _rewrite_graph
+from tinygrad.nn.state import get_parameters
+
+def build_graph():
+  # forward and backward of a transformer, never realized
+  Tensor.manual_seed(0)
+  mdl = Transformer(syms=10, maxlen=getenv("MAXLEN", 64), layers=getenv("LAYERS", 8), embed_dim=128, num_heads=4, ff_dim=256)
+  for p in (params:=get_parameters(mdl)): p.requires_grad = True
+  x = Tensor.empty(getenv("BS", 4), getenv("MAXLEN", 64), dtype=dtypes.int32)
+  loss = mdl.forward(x).mean()
+  loss.backward()
+  return [loss] + [p.grad for p in params]
+
+def count_nodes(outs:list) -> int:
+  seen, stack = set(), [t.lazydata if isinstance(t, Tensor) else t for t in outs]
+  while stack:
+    if (lb:=stack.pop()) in seen: continue
+    seen.add(lb)
+    stack.extend([lb.base] if lb.base is not lb else getattr(lb, 'srcs', ()))
+  return len(seen)
+
+if __name__ == "__main__":
+  tms = []
+  for _ in range(getenv("CNT", 5)):
+    gc.collect()
+    st = time.perf_counter()
+    outs = build_graph()
+    tms.append(time.perf_counter()-st)
+    del outs
+  nodes = count_nodes(outs:=build_graph())
+  del outs
+  gc.collect()
+  tracemalloc.start()
+  outs = build_graph()
+  gc.collect()
+  mem = tracemalloc.get_traced_memory()[0]
+  tracemalloc.stop()
+  lb = outs[0].lazydata.base
+  print(f"{nodes} nodes in {min(tms)*1e3:.2f} ms, {nodes/min(tms):.0f} nodes/sec")
+  print(f"{mem/nodes:.1f} bytes/node, LazyBuffer instance {sys.getsizeof(lb) + (sys.getsizeof(lb.__dict__) if hasattr(lb, '__dict__') else 0)} bytes")
+
+  # graph rewrite before scheduling
+  for rewrite in [0, 1]:
+    tms = []
+    for _ in range(getenv("CNT", 5)):
+      lbs = [t.lazydata for t in build_graph()]
+      with Context(GRAPH_REWRITE=rewrite, SCHEDULE_CACHE=0):
+        st = time.perf_counter()
+        GlobalCounters.reset()
+        sched = create_schedule(lbs)
+        tms.append(time.perf_counter()-st)
+    print(f"GRAPH_REWRITE={rewrite}: {GlobalCounters.graph_rewrites} rewrites, {len(sched)} kernels scheduled in {min(tms)*1e3:.2f} ms")
+  nodes = count_nodes(lbs:=[t.lazydata for t in build_graph()])
+  rewrites = _rewrite_graph(lbs)
+  print(f"{nodes} nodes -> {count_nodes(lbs)} nodes after {rewrites} rewrites")
@@ -0,0 +1,22 @@
+import time
+from extra.models.resnet import ResNet50
+from tinygrad import Tensor
+from tinygrad.helpers import getenv, dedup
+from tinygrad.ops import MetaOps
+from tinygrad.codegen.kernel import Kernel
+
+if __name__ == "__main__":
+  out = ResNet50()(Tensor.empty(getenv("BS", 8), 3, 224, 224))
+  asts = dedup([x.ast for x in out.schedule() if x.ast.op is MetaOps.KERNEL])[:getenv("KERNELS", 1000)]
+  graphs = []
+  for ast in asts:
+    k = Kernel(ast)
+    k.hand_coded_optimizations()
+    graphs.append((k.name, k.linearize().uops))
+
+  # time the largest kernels, where the linearizer cost is
+  graphs = sorted(graphs, key=lambda x: -len(x[1].uops))[:getenv("TOP", 10)]
+  for nm,g in graphs:
+    st = time.perf_counter()
+    for _ in range(getenv("CNT", 3)): g.linearize()
+    print(f"{len(g.uops):6d} uops {(time.perf_counter()-st)/getenv('CNT', 3)*1e3:8.2f} ms  {nm}")
@@ -0,0 +1,46 @@
+import itertools, time
+from extra.models.resnet import ResNet50
+from tinygrad import Tensor
+from tinygrad.helpers import getenv, dedup
+from tinygrad.ops import MetaOps
+from tinygrad.codegen.kernel import Kernel
+from tinygrad.codegen.uops import PatternMatcher, _match
+from tinygrad.codegen import uopgraph
+
+# the matcher before it was compiled, for comparison
+def interpreted_rewrite(pm:PatternMatcher, uop):
+  for p,fxn in itertools.chain(pm.pdict.get((uop.op, uop.arg), []), pm.pdict.get((uop.op, None), [])):
+    if (matches := _match(uop, p, {})) and (ret:=fxn(**matches[0])) is not None: return ret
+  return None
+
+if __name__ == "__main__":
+  out = ResNet50()(Tensor.empty(getenv("BS", 8), 3, 224, 224))
+  asts = dedup([x.ast for x in out.schedule() if x.ast.op is MetaOps.KERNEL])[:getenv("KERNELS", 1000)]
+
+  # record every rewrite the linearizer does on the kernels
+  calls, rewrite = [], PatternMatcher.rewrite
+  def recording_rewrite(self, uop):
+    calls.append((self, uop))
+    return rewrite(self, uop)
+  PatternMatcher.rewrite = recording_rewrite  # type: ignore
+  for ast in asts:
+    k = Kernel(ast)
+    k.hand_coded_optimizations()
+    k.linearize().uops.linearize()
+  PatternMatcher.rewrite = rewrite  # type: ignore
+  print(f"{len(calls)} rewrites in {len(asts)} kernels")
+
+  for nm,fxn in [("interpreted", interpreted_rewrite), ("compiled", PatternMatcher.rewrite)]:
+    tms = []
+    for _ in range(getenv("CNT", 5)):
+      st = time.perf_counter()
+      for pm,uop in calls: fxn(pm, uop)
+      tms.append(time.perf_counter()-st)
+    print(f"{nm:12s}: {min(tms)*1e3:8.2f} ms, {len(calls)/min(tms)/1e3:8.2f} k rewrites/s")
+
+  # the compiled matchers must find the same rewrites, acc_number is reset since the reduce rewrite numbers its accumulators
+  for pm,uop in calls:
+    uopgraph.acc_number = 0
+    ref = str(interpreted_rewrite(pm, uop))
+    uopgraph.acc_number = 0
+    assert ref == str(pm.rewrite(uop)), f"mismatch on {uop}"
@@ -0,0 +1,33 @@
+import random, time
+from tinygrad.helpers import getenv
+from tinygrad.shape.symbolic import Variable, NumNode
+from tinygrad.shape.shapetracker import ShapeTracker
+import test.external.fuzz_symbolic as fuzz_symbolic
+
+def fuzz_exprs(cnt:int):
+  # the expressions of fuzz_symbolic, without the checks
+  random.seed(42)
+  for _ in range(cnt):
+    fuzz_symbolic.v = [Variable(f"v{i}", 0, random.choice([*range(1, 10), 16, 32, 64, 128, 256])) for i in range(1, 4)]
+    expr = NumNode(0)
+    for op in [random.choice([fuzz_symbolic.add_v, fuzz_symbolic.div, fuzz_symbolic.mul, fuzz_symbolic.add_num, fuzz_symbolic.mod])
+               for _ in range(random.randint(2, 30))]: expr, _ = op(expr)
+    yield expr
+
+def symbolic_views(cnt:int):
+  # the index expressions of a symbolic kv cache, rebuilt for every start_pos like a JIT does
+  for i in range(cnt):
+    start_pos = Variable("start_pos", 0, 1024).bind(i % 1024 + 1)
+    st = ShapeTracker.from_shape((1, start_pos+1, 32, 128)).permute((0, 2, 1, 3)).reshape((1, 32, 1, start_pos+1, 128))
+    st = st.expand((1, 32, 4, start_pos+1, 128))
+    st = st.pad(((0, 0), (0, 0), (0, 0), (0, 1), (0, 0))).shrink(((0, 1), (0, 32), (0, 4), (1, start_pos+2), (0, 128)))
+    yield st.expr_idxs()
+
+if __name__ == "__main__":
+  for nm,gen in [("fuzz", fuzz_exprs), ("views", symbolic_views)]:
+    tms = []
+    for _ in range(getenv("CNT", 3)):
+      st = time.perf_counter()
+      out = [(hash(x), x.render()) if not isinstance(x, tuple) else [(hash(y), y.render()) for y in x] for x in gen(getenv("N", 1000))]
+      tms.append(time.perf_counter()-st)
+    print(f"{nm:6s}: {min(tms)*1e3:8.2f} ms")
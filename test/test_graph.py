@@ -1,5 +1,5 @@
 import numpy as np
-import unittest, ctypes
+import unittest, ctypes, collections
 
 from tinygrad.device import Device, Buffer
 from tinygrad.tensor import Tensor, _to_np_dtype
@@ -7,6 +7,7 @@ from tinygrad.engine.schedule import create_schedule
 from tinygrad.helpers import Context, CI, dedup, from_mv
 from tinygrad.dtype import dtypes
 from tinygrad.engine.realize import ExecItem, BufferXfer, get_runner, CompiledRunner
+from tinygrad.engine.jit import MultiGraphRunner
 
 np.random.seed(1337)
 Tensor.manual_seed(1337)
@@ -231,5 +232,19 @@ class TestGraph(unittest.TestCase):
 
     helper_test_graphs(Device[d0].graph, graphs)
 
+class TestMultiGraphDependencies(unittest.TestCase):
+  def test_views_of_one_base(self):
+    g = MultiGraphRunner.__new__(MultiGraphRunner)
+    g.w_dependency_map, g.r_dependency_map = collections.defaultdict(list), collections.defaultdict(list)
+    base = Buffer(Device.DEFAULT, 256, dtypes.uint8).ensure_allocated()
+    x, y = Buffer(Device.DEFAULT, 16, dtypes.int, base=base, offset=0), Buffer(Device.DEFAULT, 16, dtypes.int, base=base, offset=64)
+    # disjoint views of an arena don't wait on each other
+    self.assertEqual(g._access_resources([], [x], 0), [])
+    self.assertEqual(g._access_resources([], [y], 1), [])
+    self.assertEqual(g._access_resources([x], [y], 2), [0, 1])
+    # the base overlaps both views
+    self.assertEqual(g._access_resources([], [base], 3), [0, 2])
+    self.assertEqual(g._access_resources([y], [], 4), [3])
+
 if __name__ == '__main__':
   unittest.main()
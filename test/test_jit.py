@@ -1,5 +1,5 @@
 #!/usr/bin/env python
-import unittest, functools
+import unittest, functools, subprocess, sys, pathlib
 import numpy as np
 
 from hypothesis import given, settings, strategies as strat
@@ -7,7 +7,7 @@ from test.helpers import assert_jit_cache_len
 from tinygrad.tensor import Tensor
 from tinygrad.engine.jit import TinyJit
 from tinygrad.device import Device
-from tinygrad.helpers import CI, Context
+from tinygrad.helpers import CI, Context, temp
 from tinygrad.dtype import dtypes
 from extra.models.unet import ResBlock
 
@@ -127,6 +127,21 @@ class TestJit(unittest.TestCase):
     with self.assertRaises(AssertionError):
       add(a, bad)
 
+  def test_jit_multiple_shapes(self):
+    calls = 0
+    def f(a, b):
+      nonlocal calls
+      calls += 1
+      return (a+b).realize()
+    add = TinyJit(f, max_captures=2)
+    for n in [10, 10, 10, 5, 5, 10, 5, 7, 7, 10, 10]:
+      a, b = Tensor.randn(n, n), Tensor.randn(n, n)
+      np.testing.assert_allclose(add(a, b).numpy(), a.numpy()+b.numpy(), atol=1e-4, rtol=1e-5)
+    # 10 is ignored then captured, 5 and 7 are captured right away, 10 is captured again after 7 evicted it
+    self.assertEqual(calls, 5)
+    self.assertEqual(len(add.captures), 1)
+    assert_jit_cache_len(add, 1)
+
   def test_jit_shape_views_mismatch(self):
     @TinyJit
     def add(a): return (a+1).realize()
@@ -371,6 +386,26 @@ class TestJit(unittest.TestCase):
       xc = jf(a)
       np.testing.assert_allclose((a.numpy().sum(axis=(1,)) + 5).view(np.int32), xc.numpy(), atol=1e-4, rtol=1e-5)
 
+  def test_jit_save_load(self):
+    w = Tensor.randn(10, 10).realize()
+    @TinyJit
+    def f(a, b): return ((a @ w).relu().contiguous() @ w + b).realize()
+    for _ in range(3): f(Tensor.randn(10, 10), Tensor.randn(10, 10))
+    f.save(fn:=temp("test_jit_save_load"))
+    np.save(wfn:=temp("test_jit_save_load_w.npy"), w.numpy())
+    # the saved JIT replays in a new process, without the function or the weight Tensor
+    subprocess.run([sys.executable, "-c", f"""
+import numpy as np
+from tinygrad import Tensor
+from tinygrad.engine.jit import TinyJit
+from test.helpers import assert_jit_cache_len
+f2, w = TinyJit.load({fn!r}), np.load({wfn!r})
+for _ in range(3):
+  a, b = Tensor.randn(10, 10), Tensor.randn(10, 10)
+  np.testing.assert_allclose(f2(a, b).numpy(), np.maximum(a.numpy() @ w, 0) @ w + b.numpy(), atol=1e-4, rtol=1e-5)
+assert_jit_cache_len(f2, 2)
+"""], cwd=pathlib.Path(__file__).parent.parent, check=True)
+
 @unittest.skip("Pending multioutput implementation #3607")
 class TestMultioutputJit(unittest.TestCase):
   def _test(self, f):
@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 import numpy as np
-import unittest
+import unittest, pytest
 from tinygrad import Tensor, Device, dtypes
 from tinygrad.lazy import LazyBuffer, ReduceOps, MetaOps
 from tinygrad.engine.schedule import create_schedule
+from tinygrad.engine import graph
+from tinygrad.helpers import Context
 
 class TestLazyBuffer(unittest.TestCase):
   def test_fromcpu_shape_tracker(self):
@@ -68,6 +70,27 @@ class TestLazyBuffer(unittest.TestCase):
     assert lb.const(1).base.arg == 1.0
     assert type(lb.const(1).base.arg) is float
 
+  def test_slots(self):
+    a = Tensor.empty(4, 4) + 1
+    b = a.reshape(16)
+    for lb in [a.lazydata, b.lazydata, a.lazydata.buffer]: assert not hasattr(lb, "__dict__")
+    assert not hasattr(b.lazydata, "srcs") and hasattr(b.lazydata.base, "srcs")
+    # dropping the srcs marks the base as realized
+    assert a.lazydata.realized is None
+    a.realize()
+    assert not hasattr(a.lazydata, "srcs") and a.lazydata.realized is a.lazydata.buffer
+    assert (a + 1).lazydata is (a + 1).lazydata
+
+  def test_schedule_with_graph(self):
+    nx = pytest.importorskip("networkx")
+    a = Tensor.empty(4, 4) + 1
+    # a preset graph skips the atexit save
+    G, graph.G = graph.G, nx.DiGraph() if graph.G is None else graph.G
+    try:
+      with Context(GRAPH=1): create_schedule([a.lazydata])
+    finally: graph.G = G
+    assert isinstance(a.lazydata.node_id, int)
+
 class TestReduceOp(unittest.TestCase):
   def test_no_split_reduce_kernel(self):
     a = Tensor.rand(4, 4).realize()
@@ -9,7 +9,8 @@ from tinygrad.codegen.lowerer import get_grouped_dims
 from tinygrad.codegen.uops import UOp, UOps
 from tinygrad.device import Device, Buffer
 from tinygrad.ops import BinaryOps, BufferOps, MemBuffer, ConstBuffer, LazyOp, MetaOps, TernaryOps, ReduceOps, UnaryOps
-from tinygrad.renderer import TensorCore
+from tinygrad.renderer import TensorCore, Gemm
+from tinygrad.renderer.cstyle import ClangRenderer
 from tinygrad.shape.shapetracker import ShapeTracker
 from tinygrad.shape.view import View
 # from tinygrad.shape.symbolic import Variable
@@ -925,7 +926,11 @@ class TestLinearizer(unittest.TestCase):
     """
     x, y = Tensor.randn(64,64), Tensor.randn(64,64)
     out = x.matmul(y)
-    k = helper_linearizer_opt(out)[-1]
+    # a native gemm doesn't upcast the store
+    renderer = Device[Device.DEFAULT].renderer
+    has_gemm, renderer.has_gemm = renderer.has_gemm, False
+    try: k = helper_linearizer_opt(out)[-1]
+    finally: renderer.has_gemm = has_gemm
     # check that the float4 cast collapses
     store_vals = [u.src[-1] for u in k.uops if u.op is UOps.STORE]
     for val in store_vals:
@@ -976,6 +981,7 @@ class TestLinearizer(unittest.TestCase):
     # the global store doesn't change
     assert stores[1].src[2].dtype == dtypes.float
 
+  @unittest.skipUnless(Device[Device.DEFAULT].renderer.has_local, "test requires locals")
   @unittest.skipUnless(Device[Device.DEFAULT].renderer.supports_float4, "test requires float4")
   def test_skip_unmatching_upcasts(self):
     Tensor.manual_seed(0)
@@ -1026,6 +1032,14 @@ class TestFloat4(unittest.TestCase):
 
     assert TestFloat4.count_float4(k) == (2, 1)
 
+  def test_float4_clang_vector_types(self):
+    a, b = Tensor.rand(2, 8).realize(), Tensor.rand(2, 8).realize()
+    k = Kernel(create_schedule([(a+b).lazydata])[0].ast, opts=ClangRenderer())
+    k.hand_coded_optimizations()
+    src = k.to_program().src
+    assert "typedef float float4 __attribute__((aligned(4),vector_size(16),may_alias));" in src
+    assert src.count("*((float4*)") == 3 and "val0[3]" in src
+
   def test_float4_multidim(self):
     a = Tensor.rand(2, 8).realize()
     b = Tensor.rand(2, 8).realize()
@@ -1176,6 +1190,7 @@ class TestFloat4(unittest.TestCase):
       count = len([uop for uop in k.uops if uop.op is UOps.DEFINE_ACC and uop.dtype == dtypes.float.vec(4)])
       assert count == expected, f"{count=}, {expected=}"
 
+  @unittest.skipUnless(Device[Device.DEFAULT].renderer.has_local, "test requires locals")
   def test_float2_acc(self):
     # from resnet
     ast = LazyOp(op=BufferOps.STORE, src=(LazyOp(op=UnaryOps.CAST, src=(LazyOp(op=ReduceOps.SUM, src=(LazyOp(op=UnaryOps.CAST, src=(LazyOp(op=BufferOps.LOAD, src=(), arg=MemBuffer(idx=1, dtype=dtypes.half, st=ShapeTracker(views=(View(shape=(256, 64, 3, 56, 2, 3, 56, 2), strides=(1806336, 28224, 3, 504, 0, 1, 9, 0), offset=0, mask=((0, 256), (0, 64), (0, 3), (0, 56), (0, 1), (0, 3), (0, 56), (0, 1)), contiguous=False), View(shape=(256, 64, 3, 115, 3, 115), strides=(7225344, 112896, 37632, 336, 112, 1), offset=0, mask=((0, 256), (0, 64), (0, 3), (0, 112), (0, 3), (0, 112)), contiguous=False), View(shape=(256, 64, 456, 456), strides=(7617600, 119025, 345, 1), offset=0, mask=((0, 256), (0, 64), (0, 345), (0, 345)), contiguous=False), View(shape=(1, 256, 1, 64, 4, 114, 4, 114), strides=(0, 13307904, 0, 207936, 51984, 456, 114, 1), offset=0, mask=None, contiguous=True))))),), arg=dtypes.float),), arg=(4, 6)),), arg=dtypes.half),), arg=MemBuffer(idx=0, dtype=dtypes.half, st=ShapeTracker(views=(View(shape=(1, 256, 1, 64, 1, 114, 1, 114), strides=(0, 831744, 0, 12996, 0, 114, 0, 1), offset=0, mask=None, contiguous=True),))))  # noqa: E501
@@ -1265,6 +1280,49 @@ class TestHandCodedOpts(unittest.TestCase):
     assert k.local_dims == 1
     assert k.upcasted == 1
 
+  def test_threads(self):
+    renderer = ClangRenderer()
+    renderer.has_threads, renderer.global_max = True, (6,)
+    a, b = Tensor.rand(192, 256).realize(), Tensor.rand(192, 256).realize()
+    k = Kernel(create_schedule([(a+b).sum(1).lazydata])[-1].ast, opts=renderer)
+    k.hand_coded_optimizations()
+    assert k.threaded and k.full_shape[0] == 6
+    with self.assertRaises(KernelOptError): k.apply_opt(Opt(OptOps.UPCAST, 0, 2))
+    p = k.to_program()
+    assert p.global_size == [6, 1, 1] and p.local_size == [1, 1, 1]
+    assert "int gidx0 = core_id;" in p.src and "const int core_id)" in p.src
+    if Device.DEFAULT == "CLANG":
+      out = Buffer("CLANG", 192, dtypes.float).allocate()
+      CompiledRunner(p).exec([out, a.lazydata.base.realized, b.lazydata.base.realized])
+      np.testing.assert_allclose(np.frombuffer(out.as_buffer(), np.float32), (a.numpy()+b.numpy()).sum(1), rtol=1e-5)
+
+  def test_cpu_matmul(self):
+    renderer = ClangRenderer()
+    renderer.cache_sizes, renderer.has_gemm = (32768, 65536), False
+    a, b = Tensor.rand(128, 256).realize(), Tensor.rand(256, 128).realize()
+    k = Kernel(create_schedule([(a@b).lazydata])[-1].ast, opts=renderer)
+    k.hand_coded_optimizations()
+    # the second input is 128KB, so the rows are tiled to keep a 32KB row panel of the first
+    assert k.applied_opts == [Opt(OptOps.UPCAST, 1, 4), Opt(OptOps.UPCAST, 1, 4), Opt(OptOps.UPCAST, 0, 8), Opt(OptOps.UNROLL, 0, 4),
+                              Opt(OptOps.TILE, 0, 4)]
+    if not Device[Device.DEFAULT].renderer.has_local:
+      helper_linearizer_opt(a@b, [[Opt(OptOps.TILE, 0, 4)], [Opt(OptOps.TILE, 0, 8), Opt(OptOps.TILE, 1, 4), Opt(OptOps.UPCAST, 0, 4)]])
+    else:
+      with self.assertRaises(KernelOptError): Kernel(k.ast).apply_opt(Opt(OptOps.TILE, 0, 4))
+
+  def test_cpu_gemm(self):
+    renderer = ClangRenderer()
+    renderer.cache_sizes, renderer.has_gemm = (32768, 65536), True
+    a, b = Tensor.rand(2, 100, 70).realize(), Tensor.rand(2, 70, 90).realize()
+    for fxn,gemm in [(lambda a,b: a@b, Gemm(2, 100, 90, 70, (0, 0, (9000, 90, 1)), (1, 0, (7000, 70, 1)), (2, 0, (6300, 90, 1)))),
+                     (lambda a,b: a[0]@a[1].T, Gemm(1, 100, 100, 70, (0, 0, (0, 100, 1)), (1, 0, (0, 70, 1)), (1, 7000, (0, 1, 70))))]:
+      k = Kernel(create_schedule([fxn(a, b).lazydata])[-1].ast, opts=renderer).hand_coded_optimizations()
+      assert k.native_gemm == gemm and k.applied_opts == []
+      if Device.DEFAULT == "CLANG": np.testing.assert_allclose(fxn(a, b).numpy(), fxn(a.numpy(), b.numpy()), atol=1e-4, rtol=1e-4)
+    # small matmuls, elementwise epilogues and masked inputs use the generic kernel
+    for out in [a[0, :16]@b[0, :, :16], (a@b).relu(), a.pad(((0, 0), (0, 0), (1, 1)))@b.pad(((0, 0), (1, 1), (0, 0)))]:
+      assert Kernel(create_schedule([out.lazydata])[-1].ast, opts=renderer).hand_coded_optimizations().native_gemm is None
+
 def helper_linearizer_ast(ast:Union[Tuple[LazyOp, ...], LazyOp], inputs:List[Tensor], *args, **kwargs):
   if not isinstance(ast, LazyOp): ast = LazyOp(MetaOps.KERNEL, ast)
   inbufs = [x.lazydata.base.buffer for x in inputs]
@@ -1,5 +1,10 @@
-import unittest
+import unittest, os, threading
+import numpy as np
 from tinygrad import Tensor, Device, Variable
+from tinygrad.helpers import Context
+from tinygrad.device import Compiler
+from tinygrad.ops import MetaOps
+from tinygrad.engine.realize import compile_schedule, run_schedule, method_cache, _disk_method_key
 from examples.gpt2 import Transformer
 from tinygrad.nn.state import get_state_dict
 
@@ -30,6 +35,93 @@ class TestMethodCache(unittest.TestCase):
     Device[Device.DEFAULT].compiler = None
     ((c+d)+(a+b)).realize()
 
+  def test_compile_schedule(self):
+    a, b = Tensor.rand(7, 11).realize(), Tensor.rand(11, 7).realize()
+    out = ((a@b).relu() + a.sum(1, keepdim=True)).contiguous()
+    sched = out.schedule()
+    compile_schedule(sched, 4)
+    Device[Device.DEFAULT].compiler = None
+    run_schedule(sched)
+    Device[Device.DEFAULT].compiler = self.backup_compiler
+    np.testing.assert_allclose(out.numpy(), np.maximum(a.numpy()@b.numpy(), 0) + a.numpy().sum(1, keepdims=True), atol=1e-5)
+
+  def test_compile_schedule_not_thread_safe(self):
+    threads, compiler = set(), self.backup_compiler
+    class SerialCompiler(Compiler):
+      def compile(self, src:str) -> bytes:
+        threads.add(threading.get_ident())
+        return compiler.compile(src)
+    a, b = Tensor.rand(5, 17).realize(), Tensor.rand(17, 5).realize()
+    out = ((a@b).relu() + a.sum(1, keepdim=True)).contiguous()
+    sched = out.schedule()
+    Device[Device.DEFAULT].compiler = SerialCompiler()
+    compile_schedule(sched, 4)
+    Device[Device.DEFAULT].compiler = self.backup_compiler
+    self.assertEqual(threads, {threading.get_ident()})
+    run_schedule(sched)
+    np.testing.assert_allclose(out.numpy(), np.maximum(a.numpy()@b.numpy(), 0) + a.numpy().sum(1, keepdims=True), atol=1e-5)
+
+  def test_disk_method_key_renderer(self):
+    renderer, ast = Device[Device.DEFAULT].renderer, (Tensor.empty(4, 4)+1).schedule()[-1].ast
+    key = _disk_method_key(Device.DEFAULT, ast)
+    for attr,val in [("has_gemm", not renderer.has_gemm), ("cache_sizes", (1, 2)), ("global_max", (3,))]:
+      old = getattr(renderer, attr)
+      setattr(renderer, attr, val)
+      try: self.assertNotEqual(_disk_method_key(Device.DEFAULT, ast), key)
+      finally: setattr(renderer, attr, old)
+
+  def test_disk_methodcache(self):
+    a, b = Tensor([1.0, 2.0, 3.0]), Tensor([4.0, 5.0, 6.0])
+    with Context(DISK_METHOD_CACHE=1):
+      (a*b+a).realize()
+      method_cache.clear()
+      Device[Device.DEFAULT].compiler = None
+      np.testing.assert_allclose((a*b+a).numpy(), [5.0, 12.0, 21.0])
+
+  @unittest.skipUnless(Device.DEFAULT == "CLANG", "batched compile is for CLANG")
+  def test_batch_compile(self):
+    a, b = Tensor.rand(7, 13).realize(), Tensor.rand(13, 7).realize()
+    out = ((a@b).relu() + a.sum(1, keepdim=True)).contiguous()
+    sched = out.schedule()
+    with Context(BATCH_COMPILE=1): compile_schedule(sched, 1)
+    libs = [method_cache[(Device.DEFAULT, si.ast, 0, False)].lib for si in sched if si.ast.op is MetaOps.KERNEL]
+    assert len(libs) == 2 and libs[0] is libs[1]
+    Device[Device.DEFAULT].compiler = None
+    run_schedule(sched)
+    Device[Device.DEFAULT].compiler = self.backup_compiler
+    np.testing.assert_allclose(out.numpy(), np.maximum(a.numpy()@b.numpy(), 0) + a.numpy().sum(1, keepdims=True), atol=1e-5)
+    from tinygrad.runtime.ops_clang import batched_libs, BATCH_REF
+    assert libs[0].startswith(BATCH_REF) and libs[0][len(BATCH_REF):].decode() in batched_libs
+
+  @unittest.skipUnless(Device.DEFAULT == "CLANG", "batched compile is for CLANG")
+  def test_batch_compile_disk_methodcache(self):
+    from tinygrad.helpers import diskcache_get
+    from tinygrad.runtime.ops_clang import batched_libs, BATCH_REF
+    a, b = Tensor.rand(9, 11).realize(), Tensor.rand(11, 9).realize()
+    out = ((a@b).exp2() + a.max(1, keepdim=True)).contiguous()
+    sched = out.schedule()
+    with Context(BATCH_COMPILE=1, DISK_METHOD_CACHE=1): compile_schedule(sched, 1)
+    kernels = [si.ast for si in sched if si.ast.op is MetaOps.KERNEL]
+    # each kernel only stores a reference, the batched lib is stored once
+    refs = [diskcache_get("method_cache", _disk_method_key(Device.DEFAULT, ast))[2] for ast in kernels]
+    assert len(refs) == 2 and refs[0] == refs[1] and refs[0].startswith(BATCH_REF)
+    assert diskcache_get("clang_batch", refs[0][len(BATCH_REF):].decode()) is not None
+    # a new process loads the batch from the diskcache
+    method_cache.clear()
+    batched_libs.clear()
+    Device[Device.DEFAULT].compiler = None
+    with Context(DISK_METHOD_CACHE=1): run_schedule(sched)
+    np.testing.assert_allclose(out.numpy(), np.exp2(a.numpy()@b.numpy()) + a.numpy().max(1, keepdims=True), atol=1e-4, rtol=1e-5)
+
+  @unittest.skipUnless(Device.DEFAULT == "CLANG" and os.path.isdir("/proc/self/fd"), "counts the open fds of CLANG libs")
+  def test_loaded_libs_close_fds(self):
+    a = Tensor.rand(16).realize()
+    fds = len(os.listdir("/proc/self/fd"))
+    with Context(BATCH_COMPILE=1):
+      for i in range(8): (a+i*1.5).realize()
+    for i in range(8): (a*(i+2.5)).realize()
+    self.assertEqual(len(os.listdir("/proc/self/fd")), fds)
+
   @unittest.skip("incorrect use of transformer")
   def test_small_transformer(self):
     args_tiny = {"dim": 16, "n_heads": 8, "n_layers": 8, "norm_eps": 1e-05, "vocab_size": 10}
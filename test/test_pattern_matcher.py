@@ -145,6 +145,26 @@ class TestPatternMatcher(TestUOps):
     assert _match(u1, pat, {})
     assert _match(u2, pat, {})
 
+  def test_first_permutation_only(self):
+    c1 = UOp(UOps.CONST, dtypes.float, arg=1.0)
+    c2 = UOp(UOps.CONST, dtypes.float, arg=2.0)
+    tried = []
+    # if fxn returns None for the first match, the other permutations aren't tried
+    matcher = PatternMatcher([(UPat(UOps.ALU, src=[UPat(name="a"), UPat(name="b")]), lambda a,b: tried.append((a,b)))])
+    self.assertEqual(matcher.rewrite(c1+c2), None)
+    self.assertEqual(tried, [(c1, c2)])
+    matcher = PatternMatcher([(UPat(UOps.ALU, src=(UPat(UOps.ALU, src=[UPat(name='a'), UPat(name='b')]), UPat(name='b'))), lambda a,b: a)])
+    self.assertIs(matcher.rewrite((c1+c2)+c1), c2)
+    self.assertIs(matcher.rewrite((c2+c1)+c1), c2)
+    self.assertEqual(matcher.rewrite((c2+c1)+c2), c1)
+
+  def test_allow_len_short_src(self):
+    matcher = PatternMatcher([(UPat(UOps.ALU, name="x", src=(UPat(UOps.CONST), UPat(UOps.CONST)), allow_any_len=True), lambda x: x)])
+    c1 = UOp(UOps.CONST, dtypes.float, arg=1.0)
+    c2 = UOp(UOps.ALU, dtypes.float, (c1,), UnaryOps.NEG)
+    self.assertEqual(matcher.rewrite(c2), c2)
+    self.assertEqual(matcher.rewrite(UOp(UOps.ALU, dtypes.float, (c2,), UnaryOps.NEG)), None)
+
   @unittest.skip("no longer supported")
   def test_rewrite_graph_folds(self):
     uops = UOpGraph()
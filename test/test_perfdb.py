@@ -0,0 +1,44 @@
+import unittest, tempfile, os
+from tinygrad import Tensor, helpers
+from tinygrad.engine import perfdb
+from tinygrad.engine.perfdb import KernelPerf, save_run, diff_runs
+
+class TestPerfDB(unittest.TestCase):
+  def setUp(self):
+    self.backup = perfdb.PERFDB, dict(perfdb.perf_stats)
+    perfdb.PERFDB = "test"
+    perfdb.perf_stats.clear()
+    # saved runs go to a temporary diskcache
+    self.db_backup = helpers.CACHEDB, helpers._db_connection, set(helpers._db_tables)
+    self.tmpdir = tempfile.mkdtemp()
+    helpers.CACHEDB, helpers._db_connection = os.path.join(self.tmpdir, "cache.db"), None
+    helpers._db_tables.clear()
+  def tearDown(self):
+    perfdb.PERFDB = self.backup[0]
+    perfdb.perf_stats.clear()
+    perfdb.perf_stats.update(self.backup[1])
+    if helpers._db_connection is not None: helpers._db_connection.close()
+    if os.path.exists(helpers.CACHEDB): os.unlink(helpers.CACHEDB)
+    os.rmdir(self.tmpdir)
+    helpers.CACHEDB, helpers._db_connection = self.db_backup[:2]
+    helpers._db_tables.clear()
+    helpers._db_tables.update(self.db_backup[2])
+
+  def test_record_kernels(self):
+    x = Tensor.ones(16, 16).contiguous().realize()
+    for _ in range(3): (x @ x).realize()
+    kernels = [kp for kp in perfdb.perf_stats.values() if kp.count == 3]
+    self.assertEqual(len(kernels), 1)
+    self.assertGreater(kernels[0].ops, 0)
+    assert 0 < kernels[0].min_s <= kernels[0].avg_s
+
+  def test_diff_runs(self):
+    save_run("test_base", {"a": KernelPerf("a", "CLANG", (), 1, min_s=1e-3), "b": KernelPerf("b", "CLANG", (), 1, min_s=1e-3)})
+    save_run("test_new", {"a": KernelPerf("a", "CLANG", (), 1, min_s=1.05e-3), "b": KernelPerf("b", "CLANG", (), 1, min_s=2e-3),
+                          "c": KernelPerf("c", "CLANG", (), 1, min_s=5e-3)})
+    regressed = diff_runs("test_base", "test_new", threshold=0.1)
+    self.assertEqual([k for k,_,_,_ in regressed], ["b"])
+    self.assertAlmostEqual(regressed[0][3], 2.0)
+
+if __name__ == '__main__':
+  unittest.main()
@@ -2,16 +2,17 @@
 # schedule confirms the right things are capable of fusing
 # NOTE: this has overlap with external_test_opt.py
 
-import unittest
+import unittest, contextlib, io
 import numpy as np
 from typing import List, Optional, Union
 from tinygrad import nn, dtypes
-from tinygrad.device import Device
+from tinygrad.device import Buffer, BufferOptions, Device
 from tinygrad.tensor import Tensor
-from tinygrad.ops import BinaryOps, MetaOps, ReduceOps, UnaryOps
-from tinygrad.helpers import DEBUG, flatten, getenv
+from tinygrad.ops import BinaryOps, BufferOps, LazyOp, MetaOps, ReduceOps, UnaryOps
+from tinygrad.helpers import DEBUG, GlobalCounters, flatten, getenv
 from tinygrad.codegen.kernel import Kernel
-from tinygrad.engine.schedule import create_schedule
+from tinygrad.engine.schedule import create_schedule, schedule_cache, memory_peak, _internal_memory_planner
+from tinygrad.shape.symbolic import Variable
 from tinygrad.engine.realize import run_schedule
 from test.helpers import is_dtype_supported, Context
 from tinygrad.function import Function
@@ -1265,6 +1266,165 @@ class TestSchedule(unittest.TestCase):
     out = x.argmax(1)
     run_schedule(check_schedule(out, 3)) # TODO: push a reduceop through a reshape
 
+class TestScheduleCache(unittest.TestCase):
+  def setUp(self):
+    schedule_cache.clear()
+    self.ctx = Context(SCHEDULE_CACHE=1)
+    self.ctx.__enter__()
+  def tearDown(self): self.ctx.__exit__()
+  def _realize(self, t:Tensor) -> Tensor:
+    GlobalCounters.reset()
+    t.realize()
+    self.hits, self.misses = GlobalCounters.schedule_cache_hits, GlobalCounters.schedule_cache_misses
+    return t
+
+  def test_same_graph_hits(self):
+    a, b = Tensor.rand(4, 4).realize(), Tensor.rand(4, 4).realize()
+    for i in range(3):
+      np.testing.assert_allclose(self._realize(((a+b)*2).sum(1)).numpy(), ((a.numpy()+b.numpy())*2).sum(1), atol=1e-5)
+      self.assertEqual((self.hits, self.misses), (int(i != 0), int(i == 0)))
+
+  def test_new_inputs_are_bound(self):
+    for i in range(3):
+      x = Tensor([i, i+1, i+2]).realize()
+      np.testing.assert_equal(self._realize(x*x).numpy(), [i*i, (i+1)**2, (i+2)**2])
+      self.assertEqual(self.hits, int(i != 0))
+
+  def test_different_shape_misses(self):
+    for n,hit in [(4, 0), (5, 0), (4, 1)]:
+      self._realize(Tensor.ones(n).contiguous()+1)
+      self.assertEqual(self.hits, hit)
+
+  def test_shared_input_differs(self):
+    a, b = Tensor.rand(4).realize(), Tensor.rand(4).realize()
+    np.testing.assert_allclose(self._realize(a+b).numpy(), a.numpy()+b.numpy())
+    np.testing.assert_allclose(self._realize(a+a).numpy(), a.numpy()*2)
+    self.assertEqual(self.hits, 0)
+
+  def test_same_asts(self):
+    a = Tensor.rand(4, 4).realize()
+    s1, s2 = ((a+1).sum(0)+a).schedule(), ((a+1).sum(0)+a).schedule()
+    self.assertEqual([si.ast for si in s1], [si.ast for si in s2])
+    self.assertNotEqual(s1[-1].outputs, s2[-1].outputs)
+
+  def test_bound_variable(self):
+    a = Tensor.rand(10).realize()
+    for i,hit in [(3, 0), (3, 1), (5, 0)]:
+      np.testing.assert_allclose(self._realize((a.shrink(((0, Variable("i", 1, 10).bind(i)),))+1).sum()).numpy(), (a.numpy()[:i]+1).sum(), atol=1e-5)
+      self.assertEqual(self.hits, hit)
+
+  def test_replay_matches(self):
+    def f(a, b): return ((a@b).relu().contiguous() @ b + a).sum(1) / (a.max(1)+1)
+    for i in range(3):
+      a, b = Tensor.rand(8, 8).realize(), Tensor.rand(8, 8).realize()
+      out = self._realize(f(a, b)).numpy()
+      self.assertEqual(self.hits, int(i != 0))
+      with Context(SCHEDULE_CACHE=0): np.testing.assert_allclose(out, f(a, b).numpy())
+
+  def test_disabled(self):
+    with Context(SCHEDULE_CACHE=0):
+      for _ in range(2): self._realize(Tensor.ones(4).contiguous()+1)
+    self.assertEqual(self.hits+self.misses, 0)
+
+class TestGraphRewrite(unittest.TestCase):
+  def _check(self, t:Tensor, allowed:int, rewrites:int, rewrite=1) -> List[LazyOp]:
+    GlobalCounters.reset()
+    with Context(GRAPH_REWRITE=rewrite): sched = check_schedule(t, allowed)
+    asts = [si.ast for si in sched]
+    run_schedule(sched)
+    self.assertEqual(GlobalCounters.graph_rewrites, rewrites)
+    return asts
+
+  def test_cse_commutative(self):
+    a, b = Tensor.rand(16, 16).realize(), Tensor.rand(16, 16).realize()
+    self._check((a+b).sum(1) + (b+a).sum(1), 2, 0, rewrite=0)
+    out = (a+b).sum(1) + (b+a).sum(1)
+    self._check(out, 1, 2)
+    np.testing.assert_allclose(out.numpy(), 2*(a.numpy()+b.numpy()).sum(1), atol=1e-5)
+
+  def test_reassociate_int_consts(self):
+    a = Tensor([1, 2, 3], dtype=dtypes.int32).realize()
+    out = ((a+1)+2)*3*4
+    ast = self._check(out, 1, 2)
+    self.assertEqual(len([x for x in ast[0].lazyops if x.op is BufferOps.CONST]), 2)
+    np.testing.assert_equal(out.numpy(), (a.numpy()+3)*12)
+
+  def test_no_reassociate_float_consts(self):
+    a = Tensor([1.0, 2.0, 3.0]).realize()
+    self._check((a+1)+2, 1, 0)
+
+  def test_cast_round_trip(self):
+    a = Tensor([1, -2, 3], dtype=dtypes.int8).realize()
+    out = a.cast(dtypes.int32).cast(dtypes.int8) + 1
+    ast = self._check(out, 1, 1)
+    self.assertNotIn(UnaryOps.CAST, [x.op for x in ast[0].lazyops])
+    np.testing.assert_equal(out.numpy(), a.numpy()+1)
+
+  def test_lossy_cast_round_trip(self):
+    a = Tensor([1, 300, -70000], dtype=dtypes.int32).realize()
+    out = a.cast(dtypes.int8).cast(dtypes.int32) + 1
+    self._check(out, 1, 0)
+    np.testing.assert_equal(out.numpy(), a.numpy().astype(np.int8).astype(np.int32)+1)
+
+  def test_report_kernels(self):
+    a = Tensor.rand(16, 16).realize()
+    out = (a+1).sum(1) + (1+a).sum(1)
+    with Context(GRAPH_REWRITE=1, DEBUG=2), contextlib.redirect_stdout(io.StringIO()) as stdout: check_schedule(out, 1)
+    self.assertIn("graph rewrite removed 2 LazyBuffers and 1 kernels", stdout.getvalue())
+
+  def test_reduce_of_expand(self):
+    a = Tensor.rand(16, 1).realize()
+    for out,np_out,rop in [(a.expand(16, 8).sum(1), a.numpy()[:, 0]*8, ReduceOps.SUM), (a.expand(16, 8).max(1)+1, a.numpy()[:, 0]+1, ReduceOps.MAX)]:
+      self.assertNotIn(rop, [x.op for x in self._check(out, 1, 1)[0].lazyops])
+      np.testing.assert_allclose(out.numpy(), np_out, atol=1e-6)
+
+@unittest.skipUnless(hasattr(Device[Device.DEFAULT].allocator, "offset"), "arenas need offset views")
+class TestMemoryPlanner(unittest.TestCase):
+  def test_arena_packing(self):
+    a, b, c, d = [Buffer(Device.DEFAULT, 256, dtypes.float32) for _ in range(4)]
+    e = Buffer(Device.DEFAULT, 512, dtypes.half)
+    assigned = _internal_memory_planner([[a, b], [b, c], [c, d], [d, e]])
+    # different dtypes share the arena and at most two buffers are live at a time
+    self.assertEqual(len(set(x.base for x in assigned.values())), 1)
+    self.assertEqual(assigned[a].base.nbytes, 2048)
+    for x,y in [(a,b), (b,c), (c,d), (d,e)]:
+      assert assigned[x].offset + x.nbytes <= assigned[y].offset or assigned[y].offset + y.nbytes <= assigned[x].offset
+
+  def test_arena_views(self):
+    a, b = Buffer(Device.DEFAULT, 64, dtypes.float32), Buffer(Device.DEFAULT, 64, dtypes.float32)
+    bv = Buffer(Device.DEFAULT, 16, dtypes.float32, base=b, offset=32)
+    assigned = _internal_memory_planner([[a], [a, b], [bv]])
+    self.assertIs(assigned[bv].base, assigned[b].base)
+    self.assertEqual(assigned[bv].offset, assigned[b].offset + 32)
+
+  def test_single_buffer_no_arena(self):
+    a, b = Buffer(Device.DEFAULT, 64, dtypes.float32), Buffer(Device.DEFAULT, 64, dtypes.float32, options=BufferOptions(nolru=True))
+    assigned = _internal_memory_planner([[a], [b]])
+    self.assertIs(assigned[a], a)
+    self.assertIs(assigned[b], b)
+
+  def test_planned_schedule(self):
+    x = Tensor.rand(16, 16).realize()
+    out = x
+    for _ in range(6): out = (out @ x).relu().contiguous() + 1
+    xn = x.numpy()
+    on = xn
+    for _ in range(6): on = np.maximum(on @ xn, 0) + 1
+    np.testing.assert_allclose(out.numpy(), on, rtol=1e-4)
+
+  def test_memory_schedule_peak(self):
+    x = Tensor.ones(64, 64).contiguous().realize()
+    peaks = []
+    for m in [0, 1]:
+      with Context(MEMORY_SCHEDULE=m):
+        out = Tensor.stack(*[(x * i).contiguous().sum(1).contiguous() for i in range(8)]).sum(0)
+        sched = out.schedule()
+        peaks.append(memory_peak(sched))
+        run_schedule(sched)
+        np.testing.assert_allclose(out.numpy(), 64*28)
+    # each wide branch is reduced before the next one is computed
+    self.assertLess(peaks[1], peaks[0])
+
 class CycleBitcast(Function):
   def forward(self, x: LazyBuffer, allow_buffer_view=True):
     a = x.e(UnaryOps.NEG).cast(dtypes.int32, True, allow_buffer_view)
@@ -1,14 +1,16 @@
-import unittest
+import unittest, tempfile
 
 from tinygrad.codegen.kernel import Opt, OptOps
 from tinygrad.codegen.kernel import Kernel
 from tinygrad.engine.schedule import create_schedule
-from tinygrad.engine.search import time_linearizer, bufs_from_lin, actions, beam_search
+from tinygrad.engine.search import time_linearizer, bufs_from_lin, actions, beam_search, get_kernel_actions, kernel_cost, rank_kernels, \
+  train_cost_model, get_cost_weights, DEFAULT_COST_WEIGHTS, similar_ast_key, get_similar_kernels, cached_beam_search, export_beam_cache, \
+  import_beam_cache
 from tinygrad.device import Device, Buffer
 from tinygrad.ops import LazyOp, MetaOps, BufferOps, ReduceOps, BinaryOps, MemBuffer, ConstBuffer
 from tinygrad.tensor import Tensor
 from tinygrad.dtype import dtypes
-from tinygrad.helpers import Context, GlobalCounters
+from tinygrad.helpers import Context, GlobalCounters, diskcache_get, diskcache_put
 from tinygrad.engine.realize import capturing
 from tinygrad.shape.shapetracker import ShapeTracker
 from tinygrad.shape.view import View
@@ -108,5 +110,59 @@ class TestBEAM(unittest.TestCase):
     beam_search(lin, bufs, 3, disable_cache=True)
     self.assertEqual(kcount, len(Kernel.kernel_cnt))
 
+  def test_beam_bundle(self):
+    lin = Kernel(create_schedule([(Tensor.empty(16, 12) @ Tensor.empty(12, 16)).lazydata])[-1].ast)
+    best = beam_search(lin, bufs_from_lin(lin), 2)
+    with tempfile.NamedTemporaryFile() as f:
+      assert export_beam_cache(f.name, lin.opts.device, lin.opts.suffix) >= 1
+      diskcache_put("beam_search", {"ast": lin.ast.key, "amt": 2, "allow_test_size": True, "device": lin.opts.device, "suffix": lin.opts.suffix}, [])
+      assert cached_beam_search(lin, 2).applied_opts == []
+      import_beam_cache(f.name)
+    assert cached_beam_search(lin, 2).applied_opts == best.applied_opts
+
+class TestSimilarKernels(unittest.TestCase):
+  def _matmul_lin(self, n, m): return Kernel(create_schedule([(Tensor.empty(n, m) @ Tensor.empty(m, n)).lazydata])[-1].ast)
+
+  def test_similar_ast_key(self):
+    assert similar_ast_key(self._matmul_lin(50, 40).ast) == similar_ast_key(self._matmul_lin(60, 36).ast)
+    assert similar_ast_key(self._matmul_lin(50, 40).ast) != similar_ast_key(self._matmul_lin(100, 40).ast)
+    assert similar_ast_key(self._matmul_lin(50, 40).ast) != similar_ast_key(Kernel(create_schedule([(Tensor.empty(50, 40)+1).lazydata])[-1].ast).ast)
+
+  def test_beam_seeds_similar(self):
+    lin = self._matmul_lin(24, 20)
+    best = beam_search(lin, bufs_from_lin(lin), 2, disable_cache=True)
+    key = {"ast": similar_ast_key(lin.ast), "device": lin.opts.device, "suffix": lin.opts.suffix}
+    assert diskcache_get("beam_search_similar", key)[0] == best.applied_opts
+    # opts that don't fit the new kernel are dropped
+    diskcache_put("beam_search_similar", key, [[Opt(OptOps.UPCAST, 0, 3)], [Opt(OptOps.UPCAST, 0, 4), Opt(OptOps.UNROLL, 0, 4)]])
+    seeded = get_similar_kernels(self._matmul_lin(28, 20))
+    assert [k.applied_opts for k in seeded] == [[Opt(OptOps.UPCAST, 0, 4), Opt(OptOps.UNROLL, 0, 4)]]
+
+class TestCostModel(unittest.TestCase):
+  def test_rank_kernels(self):
+    a, b = Tensor.rand(64, 64), Tensor.rand(64, 64)
+    lin = Kernel(create_schedule([(a@b).lazydata])[-1].ast)
+    lins = list(get_kernel_actions(lin).values())
+    ranked = rank_kernels(lins, DEFAULT_COST_WEIGHTS)
+    assert 0 < len(ranked) <= len(lins)
+    costs = [kernel_cost(k, DEFAULT_COST_WEIGHTS) for k in ranked]
+    assert costs == sorted(costs)
+    # register blocking the matmul loads less than the plain loop
+    upcasted = lin.copy()
+    for opt in [Opt(OptOps.UPCAST, 0, 4), Opt(OptOps.UPCAST, 1, 4)]: upcasted.apply_opt(opt)
+    assert kernel_cost(upcasted, DEFAULT_COST_WEIGHTS) < kernel_cost(lin.copy(), DEFAULT_COST_WEIGHTS)
+
+  def test_train_cost_model(self):
+    # two features, the time only depends on the second one
+    for ast in [b"k0", b"k1"]:
+      for i,(f0,f1) in enumerate([(1.0, 2.0), (3.0, 1.0), (2.0, 4.0)]):
+        key = {"ast": ast, "opts": str(i), "device": "FAKE_COST", "suffix": ""}
+        diskcache_put("beam_features", key, ([1.0, f0, f1], 2**(f1 + (ast == b"k1"))))
+    weights = train_cost_model("FAKE_COST")
+    self.assertAlmostEqual(weights[1], 0.0, places=5)
+    self.assertAlmostEqual(weights[2], 1.0, places=5)
+    assert get_cost_weights("FAKE_COST", "") == weights
+    with self.assertRaises(RuntimeError): train_cost_model("FAKE_NO_COST")
+
 if __name__ == '__main__':
   unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 
 from test.helpers import assert_jit_cache_len
-from tinygrad.engine.jit import TinyJit
+from tinygrad.engine.jit import TinyJit, bucket_pow2, bucket_multiple
 from tinygrad.shape.symbolic import Variable
 from tinygrad.tensor import Tensor
 import numpy as np
@@ -291,5 +291,40 @@ class TestSymbolicJit(unittest.TestCase):
         expected = a.var(1).numpy()
         np.testing.assert_allclose(symbolic, expected, atol=1e-6, rtol=1e-6)
 
+  def test_bucket_matmul(self):
+    calls = 0
+    def f(a, b):
+      nonlocal calls
+      calls += 1
+      return (a@b).realize()
+    jf = TinyJit(f, max_captures=4, bucket=bucket_pow2)
+    for i in [3, 4, 5, 6, 7, 8, 6]:
+      a, b = Tensor.rand(i, 5), Tensor.rand(5, i)
+      out = jf(a, b)
+      self.assertEqual(out.shape, (i, i))
+      np.testing.assert_allclose(out.numpy(), a.numpy() @ b.numpy(), atol=1e-6, rtol=1e-6)
+    # 5 to 8 share the bucket of 8, it is ignored once and captured once
+    self.assertEqual(calls, 4)
+    assert_jit_cache_len(jf, 1)
+
+  def test_bucket_default_captures(self):
+    def f(a): return (a+1).realize()
+    jf = TinyJit(f, bucket=bucket_pow2)
+    # 9 crosses into the bucket of 16
+    for i in [4, 6, 7, 8, 9, 12, 5]:
+      a = Tensor.rand(i)
+      np.testing.assert_allclose(jf(a).numpy(), a.numpy()+1, atol=1e-6, rtol=1e-6)
+    self.assertEqual(len(jf.captures), 2)
+    with self.assertRaises(AssertionError): TinyJit(f, max_captures=0, bucket=bucket_pow2)
+
+  def test_bucket_multiple(self):
+    def f(a, b): return (a+b).sum(1).realize()
+    jf = TinyJit(f, max_captures=2, bucket=bucket_multiple(16))
+    for i in range(1, 12):
+      a, b = Tensor.rand(3, i), Tensor.rand(3, i)
+      np.testing.assert_allclose(jf(a, b).numpy(), (a.numpy()+b.numpy()).sum(1), atol=1e-6, rtol=1e-6)
+    assert_jit_cache_len(jf, 1)
+    self.assertEqual(len(jf.captures), 1)
+
 if __name__ == '__main__':
   unittest.main()
\ No newline at end of file
@@ -3,7 +3,7 @@ import numpy as np
 from tinygrad import Tensor, Device, dtypes
 from tinygrad.dtype import DType
 from tinygrad.nn.state import safe_load, safe_save, get_state_dict, torch_load
-from tinygrad.helpers import Timing, fetch, temp, CI
+from tinygrad.helpers import Timing, Context, fetch, temp, CI
 from test.helpers import is_dtype_supported
 
 def compare_weights_both(url):
@@ -333,5 +333,18 @@ class TestDiskTensor(unittest.TestCase):
       on_dev = t.to(Device.DEFAULT).realize()
       np.testing.assert_equal(on_dev.numpy(), t.numpy())
 
+  def test_async_copy_from_disk(self):
+    fn = pathlib.Path(temp("dt_async_copy_from_disk"))
+    fn.unlink(missing_ok=True)
+    fn.write_bytes(np.arange(64*1024, dtype=np.float32).tobytes())
+
+    x = Tensor.ones(64, 64).contiguous().realize()
+    with Context(ASYNC_COPY=1):
+      t = Tensor.empty(64*1024, device=f"disk:{temp('dt_async_copy_from_disk')}", dtype=dtypes.float32)
+      y = x
+      for _ in range(4): y = (y @ x).contiguous()
+      out = (t.to(Device.DEFAULT).reshape(16, 4096).sum(1) + y.sum()).numpy()
+    np.testing.assert_allclose(out, np.arange(64*1024, dtype=np.float32).reshape(16, 4096).sum(1) + 64**6, rtol=1e-5)
+
 if __name__ == "__main__":
   unittest.main()
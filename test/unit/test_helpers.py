@@ -2,6 +2,7 @@ import unittest
 from PIL import Image
 from tinygrad.helpers import Context, ContextVar
 from tinygrad.helpers import merge_dicts, strip_parens, prod, round_up, fetch, fully_flatten, from_mv, to_mv, get_contraction, get_shape
+from tinygrad.helpers import bounded_cache, LRUCaches
 from tinygrad.shape.symbolic import Variable, NumNode
 
 VARIABLE = ContextVar("VARIABLE", 0)
@@ -178,6 +179,26 @@ class TestMemoryview(unittest.TestCase):
     mv[0] = 2
     assert base[0] == 2
 
+class TestBoundedCache(unittest.TestCase):
+  def test_evict(self):
+    calls = []
+    @bounded_cache("test_evict", maxsize=2)
+    def f(x): return calls.append(x) or x
+    for x in [1, 2, 1, 3, 2]: f(x)
+    # 2 was the least recently used when 3 came in
+    assert calls == [1, 2, 3, 2]
+    hits, misses, maxsize, currsize = LRUCaches.stats()["test_evict"]
+    assert (hits, misses, maxsize, currsize) == (1, 4, 2, 2)
+
+  def test_clear_all(self):
+    @bounded_cache("test_clear_all")
+    def f(x): return x
+    f(1)
+    LRUCaches.clear_all()
+    assert LRUCaches.stats()["test_clear_all"].currsize == 0
+    # the shape caches are registered too
+    assert LRUCaches.stats()["View.reshape"].currsize == 0 and "SumNode.__floordiv__" in LRUCaches.stats()
+
 class TestGetContraction(unittest.TestCase):
   def test_contraction(self):
     r = get_contraction((1,2,3,4), (2,3,4))
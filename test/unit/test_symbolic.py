@@ -333,6 +333,18 @@ class TestSymRender(unittest.TestCase):
     assert sym_render(a+1) == "(1+a)"
     assert sym_render(a*b) == "(a*b)"
 
+class TestSymKey(unittest.TestCase):
+  def test_key_is_debug_render(self):
+    a, b = Variable("a", 0, 8), Variable("b", 1, 10)
+    for x in [a*b, b*a, (a*3+b)//4, ((a+b)*2+1)%5, (a*b+a+3) < b, Node.ands([a < 3, b < 4])]:
+      assert x.key == x.render(ctx="DEBUG"), f"{x.key} != {x.render(ctx='DEBUG')}"
+
+  def test_bind_changes_key(self):
+    a = Variable("a", 1, 8)
+    assert a.key == "a[1-8]" and hash(a) == hash(Variable("a", 1, 8))
+    a.bind(3)
+    assert a.key == "a[1-8=3]" and a != Variable("a", 1, 8) and a == Variable("a", 1, 8).bind(3)
+
 class TestSymInfer(unittest.TestCase):
   def test_sym_infer(self):
     a = Variable("a", 0, 10)
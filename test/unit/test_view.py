@@ -1,6 +1,10 @@
 #!/usr/bin/env python
-import unittest
+import unittest, pickle, gc
+from dataclasses import dataclass
+from tinygrad.helpers import Interned
 from tinygrad.shape.view import View
+from tinygrad.shape.shapetracker import ShapeTracker
+from tinygrad.shape.symbolic import Variable
 
 class TestView(unittest.TestCase):
   def test_canonicalize_empty_mask(self):
@@ -38,5 +42,42 @@ class TestView(unittest.TestCase):
     v = View.create(shape=(2,3,4), mask=((0,2),(0,3),(0,4)))
     assert v.contiguous
 
+class TestInterned(unittest.TestCase):
+  def test_same_object(self):
+    v = View.create((2,3), mask=((0,2),(1,3)))
+    assert View(shape=(2,3), strides=(3,1), offset=0, mask=((0,2),(1,3)), contiguous=False) is v
+    assert ShapeTracker((v,)) is ShapeTracker(views=(v,)) and pickle.loads(pickle.dumps(ShapeTracker((v,)))) is ShapeTracker((v,))
+    # bound variables with different values are different views
+    def i(val): return Variable("i", 1, 10).bind(val)
+    assert View.create((i(2), 3)) is not View.create((i(3), 3)) and View.create((i(2), 3)) is View.create((i(2), 3))
+
+  def test_cleared_table(self):
+    v = View.create((5,7))
+    View._interned.clear()
+    v2 = View(v.shape, v.strides, v.offset, v.mask, v.contiguous)
+    assert v2 is not v and v2 == v and hash(v2) == hash(v) and {v:1}[v2] == 1
+
+  def test_keywords_and_defaults(self):
+    @dataclass(frozen=True, eq=False)
+    class P(metaclass=Interned):
+      x: int
+      y: int = 2
+    assert P(1) is P(1, 2) is P(x=1) is P(y=2, x=1) is P(1, y=2) and P(2, 1) is not P(1, 2)
+    with self.assertRaises(TypeError): P(y=1)
+
+  def test_weak_table(self):
+    v = View((3,5,7), (35,7,1), 0, None, True)
+    key = v._key
+    assert View._interned[key]() is v
+    del v
+    gc.collect()
+    assert key not in View._interned
+
+  def test_bind_after_create(self):
+    v = Variable("i", 1, 10)
+    a = View.create((v, 4))
+    b = View.create((v.bind(3), 4))
+    assert a == b and a.shape == b.shape
+
 if __name__ == '__main__':
   unittest.main()
@@ -6,8 +6,8 @@ from typing import Optional, List, Tuple, cast, Dict, Union, Final, DefaultDict
 
 from tinygrad.ops import LazyOp, UnaryOps, BinaryOps, ReduceOps, MemBuffer, ConstBuffer, BufferOps, MetaOps, UNSAFE_PAD_OPS, verify_lazyop, KernelInfo
 from tinygrad.device import Device
-from tinygrad.renderer import Renderer, TensorCore, Program
-from tinygrad.dtype import ImageDType
+from tinygrad.renderer import Renderer, TensorCore, Program, Gemm
+from tinygrad.dtype import ImageDType, dtypes
 from tinygrad.helpers import all_same, colored, ansilen, dedup, getenv, prod, DEBUG, TC_OPT, USE_TC, round_up, all_int, \
                              get_contraction, to_function_name, diskcache_put, ContextVar
 from tinygrad.shape.shapetracker import ShapeTracker
@@ -21,7 +21,7 @@ from enum import Enum, auto
 
 class OptOps(Enum):
   TC = auto(); UPCAST = auto(); UPCASTMID = auto(); UNROLL = auto(); LOCAL = auto() # noqa: E702
-  GROUP = auto(); GROUPTOP = auto(); NOLOCALS = auto(); PADTO = auto(); SWAP = auto() # noqa: E702
+  GROUP = auto(); GROUPTOP = auto(); NOLOCALS = auto(); PADTO = auto(); SWAP = auto(); THREAD = auto(); TILE = auto() # noqa: E702
   def __lt__(self, x:OptOps): return self.value < x.value
 
 class KernelOptError(Exception): pass
@@ -107,6 +107,8 @@ class Kernel:
     # the local aliased buffers for A and B
     self.bufs_for_tensor_core: Dict[LazyOp, Tuple[int, int]] = {}
     self.dont_use_locals: bool = False
+    self.native_gemm: Optional[Gemm] = None
+    self.threaded: bool = False
 
     # group simplifies
     self.simplify_ones()
@@ -127,9 +129,10 @@ class Kernel:
     ret.sts = self.sts[:len(ret.bufs)+len(ret.reduceops)*2] # NOTE: must redo the local buffers with TC in beam
 
     # parameters for optimizations
-    ret.applied_opts, ret.group_for_reduces, ret.upcasted, ret.local_dims, ret.dont_use_locals = \
-      self.applied_opts[:], self.group_for_reduces, self.upcasted, self.local_dims, self.dont_use_locals
+    ret.applied_opts, ret.group_for_reduces, ret.upcasted, ret.local_dims, ret.dont_use_locals, ret.threaded = \
+      self.applied_opts[:], self.group_for_reduces, self.upcasted, self.local_dims, self.dont_use_locals, self.threaded
     ret.tensor_core, ret.tensor_core_opts, ret.bufs_for_tensor_core = self.tensor_core, self.tensor_core_opts, self.bufs_for_tensor_core
+    ret.native_gemm = self.native_gemm
 
     # uncached since linearize didn't run
     ret.applied_opts_cache = None
@@ -410,6 +413,7 @@ class Kernel:
 
     axis = opt.real_axis(self)
     check(axis < len(self.full_shape), "invalid axis")
+    check(not self.threaded or (axis != 0 and (opt.op is not OptOps.SWAP or opt.amt != 0)), "can't change the thread axis")
 
     if opt.op is OptOps.SWAP: amt = cast(int, opt.amt)  # amt is an axis in the SWAPs
     elif opt.amt is not None:
@@ -465,6 +469,17 @@ class Kernel:
       check(self.opts.has_local and not self.dont_use_locals, "NOLOCALS is meaningless if target does not support local or already not using locals")
       check(self.local_dims == 0 and self.group_for_reduces == 0, "can't have no locals with locals")
       self.dont_use_locals = True
+    elif opt.op is OptOps.THREAD:
+      check(self.opts.has_threads and self.opts.global_max is not None, "target does not support threads")
+      check(not self.threaded, "already threaded")
+      check(axis < self.global_dims, "thread is for globals")
+      check(amt <= cast(Tuple[int, ...], self.opts.global_max)[0], "more threads than cores")
+      self.shift_to(axis, amt, top=True, insert_before=0)
+      self.threaded = True
+    elif opt.op is OptOps.TILE:
+      check(not self.opts.has_local, "target has locals, use LOCAL")
+      check(axis < self.global_dims, "tile is for globals")
+      self.shift_to(axis, amt, insert_before=self.first_reduce)
     elif opt.op is OptOps.SWAP:
       check(axis < amt and amt < self.global_dims, f"swap is only for globals with axis < amt, getting {amt=}, {axis=}, {self.global_dims=}")
       permute = list(range(self.shape_len))
@@ -554,6 +569,39 @@ class Kernel:
 
     # **** below this line need to be optional and benchmarked ****
 
+    # cpu gemm: a plain matmul is rendered as a packed gemm kernel, only the threads it splits the rows over are picked here
+    if (gemm:=self.gemm()) is not None:
+      self.native_gemm = gemm
+      return self._apply_threads()
+
+    # cpu matmul: block the output in registers and tile the rows so the row panel of the first input stays in L2
+    # padded convs are left to the generic upcasts below, they do better unrolling their small reduces
+    if not self.opts.has_local and self.opts.cache_sizes is not None and getenv("CPU_MATMUL", 1) and all_int(self.full_shape) and \
+        self.reduceop is not None and self.reduceop.op is ReduceOps.SUM and self.upcasted == 0 and \
+        not any(v.mask for st in self.sts for v in st.views) and \
+        (mulop:=self.reduceop.src[0]).op is BinaryOps.MUL and mulop.src[0].op is BufferOps.LOAD and mulop.src[1].op is BufferOps.LOAD:
+      strides0 = self.sts[self.bufs.index(mulop.src[0].arg)].real_strides()
+      strides1 = self.sts[self.bufs.index(mulop.src[1].arg)].real_strides()
+      rows = [a for a in range(self.global_dims) if strides1[a] == 0 and strides0[a] != 0]
+      cols = sorted([a for a in range(self.global_dims) if strides0[a] == 0 and strides1[a] != 0], key=lambda a: strides1[a] != 1)
+      if rows and cols:
+        row, col = rows[-1], cols[0]
+        if (uc:=next((x for x in [16, 8, 4] if self.full_shape[col] % x == 0 and self.full_shape[col] > x), None)) is not None and \
+           (ur:=next((x for x in [8, 4, 2] if self.full_shape[row] % x == 0 and self.full_shape[row] > x), None)) is not None:
+          l2, red = self.opts.cache_sizes[1], prod(self.full_shape[self.first_reduce:])
+          in1_size = red * prod(self.full_shape[a] for a in cols) * mulop.src[1].arg.dtype.itemsize
+          # the inner 4 of the columns become float4 loads and stores
+          self.apply_opt(Opt(OptOps.UPCAST, col, 4))
+          if uc > 4: self.apply_opt(Opt(OptOps.UPCAST, col, uc // 4))
+          self.apply_opt(Opt(OptOps.UPCAST, row, ur))
+          if self.full_unupcasted_shape[-1] % 4 == 0: self.apply_opt(Opt(OptOps.UNROLL, len(self.full_unupcasted_shape)-1-self.first_reduce, 4))
+          # the second input is streamed once per row block, when it doesn't fit L2 reuse it over more rows
+          if in1_size > l2:
+            if (tile:=next((x for x in [32, 16, 8, 4, 2] if self.full_shape[row] % x == 0 and self.full_shape[row] > x and \
+                            x * ur * red * mulop.src[0].arg.dtype.itemsize <= l2 // 2), None)) is not None:
+              self.apply_opt(Opt(OptOps.TILE, row, tile))
+          return self._apply_threads()
+
     # TODO: doing extra upcasts with images doesn't work for some reason (maybe has to do with to_image_idx)
     # to trigger the above bug, remove prod(self.full_shape[self.shape_len - self.upcasted:]) from the below
     # expression and run test/test_ops.py with IMAGE=2
@@ -624,8 +672,41 @@ class Kernel:
           self.apply_opt(Opt(OptOps.LOCAL, axis, local_sz))
           if will_delete_shape: deleted_shape += 1
 
+    return self._apply_threads()
+
+  def _apply_threads(self) -> Kernel:
+    if self.opts.has_threads and self.opts.global_max is not None and all_int(self.full_shape) and prod(self.full_shape) >= 32768:
+      # split the outermost global axis that spreads best over the cores
+      thread_choices = [(t, -axis) for axis in range(self.global_dims) for t in range(min(self.opts.global_max[0], self.full_shape[axis]), 1, -1)
+                        if self.full_shape[axis] % t == 0]
+      if thread_choices:
+        amt, axis = max(thread_choices)
+        self.apply_opt(Opt(OptOps.THREAD, -axis, amt))
+
     return self
 
+  def gemm(self) -> Optional[Gemm]:
+    # a float matmul STORE(SUM(MUL(LOAD, LOAD))) with unmasked views, one row, col and reduce axis and at most one batch axis
+    if not self.opts.has_gemm or self.applied_opts or len(self.ast.src) != 1 or \
+        (red:=self.ast.src[0].src[0]).op is not ReduceOps.SUM or (mul:=red.src[0]).op is not BinaryOps.MUL or \
+        any(x.op is not BufferOps.LOAD or x.arg.dtype != dtypes.float32 for x in mul.src) or self.ast.src[0].arg.dtype != dtypes.float32: return None
+    lops = (self.ast.src[0],)+mul.src
+    sts = [self.sts[self.bufs.index(x.arg)] for x in lops]
+    if not all_int(self.full_shape) or self.shape_len-self.first_reduce != 1 or \
+        any(len(st.views) != 1 or st.views[0].mask is not None for st in sts): return None
+    strides = [cast(Tuple[int, ...], st.views[0].strides) for st in sts]
+    rows = [i for i in range(self.first_reduce) if strides[1][i] != 0 and strides[2][i] == 0]
+    cols = [i for i in range(self.first_reduce) if strides[1][i] == 0 and strides[2][i] != 0]
+    batch = [i for i in range(self.first_reduce) if strides[1][i] != 0 and strides[2][i] != 0]
+    if len(rows) != 1 or len(cols) != 1 or len(batch) > 1 or len(rows+cols+batch) != self.first_reduce or \
+        0 in (strides[1][-1], strides[2][-1]): return None
+    (m, n), K = (cast(int, self.full_shape[x[0]]) for x in (rows, cols)), cast(int, self.full_shape[-1])
+    # small matmuls do better with the generic upcasts, they don't pay for the packing
+    if min(m, n, K) < 16 or m*n*K < 64**3: return None
+    def args(i:int, ax0:int, ax1:int) -> Tuple[int, int, Tuple[int, int, int]]:
+      return (lops[i].arg.idx, cast(int, sts[i].views[0].offset), (strides[i][batch[0]] if batch else 0, strides[i][ax0], strides[i][ax1]))
+    return Gemm(cast(int, self.full_shape[batch[0]]) if batch else 1, m, n, K, args(0, rows[0], cols[0]), args(1, rows[0], -1), args(2, -1, cols[0]))
+
   # **** kernel outputs ****
 
   kernel_cnt: Final[DefaultDict[str, int]] = defaultdict(int)
@@ -710,7 +791,7 @@ class Kernel:
           local_load = LazyOp(BufferOps.LOAD, (local_store,), local_buffer)
           return LazyOp(op.op, (local_load,), tuple(range(self.first_reduce, self.first_reduce+self.group_for_reduces)))
       elif op.op is MetaOps.KERNEL:
-        arg = KernelInfo(self.local_dims, self.upcasted, self.dont_use_locals)
+        arg = KernelInfo(self.local_dims, self.upcasted, self.dont_use_locals, self.threaded)
       else:
         arg = op.arg
       return LazyOp(op.op, tuple(fixup_ast(x, apply_to_st) for x in op.src), arg)
@@ -741,6 +822,9 @@ class Kernel:
             self.local_size[int(u.arg[0][-1])] = u.arg[1]
           else:
             self.global_size[int(u.arg[0][-1])] = u.arg[1]
+    elif self.threaded:
+      # the thread axis is the only launch dimension
+      self.global_size, self.local_size = [next(u.arg[1] for u in uop_sink.parents if u.op is UOps.SPECIAL),1,1], [1,1,1]
     else:
       self.global_size, self.local_size = None, None
 
@@ -752,7 +836,9 @@ class Kernel:
 
   def to_program(self, name_override:Optional[str]=None) -> Program:
     self.linearize()
-    src = self.opts.render(name:=to_function_name(ansiname:=(name_override if name_override is not None else self.name)), self.uops)
+    name = to_function_name(ansiname:=(name_override if name_override is not None else self.name))
+    # the uops of a native gemm kernel still decide its buffers and threads
+    src = self.opts.render(name, self.uops) if self.native_gemm is None else self.opts.render_gemm(name, self.native_gemm, self.uops)
     if getenv("RUN_PROCESS_REPLAY"):
       table_name = f"process_replay_{getenv('GITHUB_RUN_ID', 'HEAD')}"
       diskcache_put(table_name, id(self), (self.ast, self.opts, self.applied_opts, name, src, {k:v.value for k,v in ContextVar._cache.items()}))
@@ -764,4 +850,4 @@ class Kernel:
       itertools.groupby([x for x in self.ast.lazyops if x.op in BufferOps and isinstance(x.arg, MemBuffer) and x.arg.idx >= 0],
                         key=lambda x: (x.op, x.arg.idx)))
     return Program(ansiname, src, self.opts.device, self.global_size, self.local_size, self.uops,
-                   ops * run_count, min(mem * run_count, mem_bytes), mem * run_count)
+                   ops * run_count, min(mem * run_count, mem_bytes), mem * run_count, self.ast.key, tuple(self.applied_opts))
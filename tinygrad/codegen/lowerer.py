@@ -116,6 +116,8 @@ class IndependentLowerer:
       # all loops are RANGES
       self.idxs = [UOp(UOps.RANGE, dtypes.bigint, (UOp.const(dtypes.bigint, 0), variable_to_uop(g)), (i, False))
                    for i,g in enumerate(full_shape[:first_reduce])]
+      # a threaded kernel runs its first axis across the cores
+      if ki.threaded: self.idxs[0] = UOp(UOps.SPECIAL, dtypes.bigint, (), ("gidx0", full_shape[0]))
 
     # reduce loops
     self.idxs += [UOp(UOps.RANGE, dtypes.bigint, (UOp.const(dtypes.bigint, 0), variable_to_uop(g)), (i, True))
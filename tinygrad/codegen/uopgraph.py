@@ -1,6 +1,7 @@
 from __future__ import annotations
-from typing import Iterator, Optional, Tuple, Dict, List, Set, Union, cast, TYPE_CHECKING
+from typing import Iterator, Optional, Tuple, Dict, List, Set, Union, cast, TYPE_CHECKING, DefaultDict
 import functools, itertools, heapq, math
+from collections import defaultdict
 from tinygrad.dtype import dtypes, PtrDType, ImageDType
 from tinygrad.shape.symbolic import Variable
 from tinygrad.ops import UnaryOps, BinaryOps, TernaryOps, ReduceOps, exec_alu
@@ -456,7 +457,8 @@ class UOpGraph:
     if TRANSCENDENTAL >= 2 or (opts is not None and TRANSCENDENTAL >= 1 and opts.device in {"CLANG", "LLVM"}):
       self.folder = self.folder + transcendental_folding
 
-  def __reduce__(self): return self.__class__, (self.sink, self.opts)
+  # NOTE: the linearized uops are kept so unpickled Programs don't linearize again
+  def __reduce__(self): return self.__class__, (self.sink, self.opts), {"_uops": self._uops}
   def __iter__(self) -> Iterator[UOp]: return iter(self.uops)
   def __getitem__(self, index) -> UOp: return self.uops[index]
 
@@ -525,37 +527,44 @@ class UOpGraph:
     # scope children impact the toposort and END* insertion
     scope_children = {p:get_recursive_children(p, END_FOR_UOP[p.op][0]) for p in reversed(in_degree) if p.op in END_FOR_UOP}
 
+    # prefer uops that are loop children, the priority and the scopes of each uop are computed once
+    priorities: DefaultDict[UOp, int] = defaultdict(int)
+    scopes: DefaultDict[UOp, List[UOp]] = defaultdict(list)
+    for l, ss in scope_children.items():
+      for u in ss:
+        if l.op is UOps.RANGE: priorities[u] -= l.arg[0]*1000 + l.arg[1]
+        scopes[u].append(l)
+    scope_left = {l:len(ss) for l, ss in scope_children.items()}
+
     queue:List[Tuple[int, UOp]] = []
-    def push(u:UOp):
-      priority = 0
-      # prefer uops that are loop children
-      for l, ss in scope_children.items():
-        if l.op is UOps.RANGE and u in ss: priority -= l.arg[0]*1000 + l.arg[1]
-      heapq.heappush(queue, (priority, u))
+    def push(u:UOp): heapq.heappush(queue, (priorities.get(u, 0), u))
 
     for u in children:
       if in_degree[u] == 0: push(u)
 
+    # DEFINE_ACCs go right before their first RANGE and END*s right after the last uop of their scope, both are placed after the toposort
     scope_end: Dict[UOp, UOp] = {}
-    self._uops = []
+    order: Dict[UOp, int] = {}
+    acc_before: DefaultDict[UOp, List[UOp]] = defaultdict(list)
     while queue:
       p,x = heapq.heappop(queue)
       if DEBUG >= 7: print(p,x)
       if x in scope_children: scope_end[x] = x
-      if x.op is UOps.DEFINE_ACC:
-        idx = min([self._uops.index(l) for l in x.src if l.op is UOps.RANGE])
-        self._uops.insert(idx, x)
-      else: self._uops.append(x)
-      for u, ss in scope_children.items():
-        if x in ss:
-          ss.remove(x)
-          if len(ss) == 0: scope_end[u] = x
+      if x.op is UOps.DEFINE_ACC: acc_before[min([l for l in x.src if l.op is UOps.RANGE], key=order.__getitem__)].append(x)
+      else: order[x] = len(order)
+      for u in scopes.get(x, []):
+        scope_left[u] -= 1
+        if scope_left[u] == 0: scope_end[u] = x
       for u in children[x]:
         in_degree[u] -= 1
         if in_degree[u] == 0: push(u)
 
-    # end scopes in toposort order
-    for u, x in scope_end.items(): self._uops.insert(self._uops.index(x)+1, UOp(END_FOR_UOP[u.op][1], None, (u,)))
+    # end scopes in toposort order, the END* of a later scope goes closer to its last uop
+    end_after: DefaultDict[UOp, List[UOp]] = defaultdict(list)
+    for u, x in scope_end.items(): end_after[x].insert(0, UOp(END_FOR_UOP[u.op][1], None, (u,)))
+    self._uops = []
+    for x in order:
+      for u in acc_before.get(x, [])+[x]: self._uops += [u]+end_after.get(u, [])
 
     # sanity checks (NOTE: these can cause things to be skipped in BEAM)
     bad_ops = dedup([x.op for x in self._uops if x.op in {UOps.EXPAND, UOps.CONTRACT, UOps.REDUCE}])
@@ -161,6 +161,46 @@ def _match(uop:UOp, pat:UPat, store:Dict[str, UOp]) -> List[Dict[str, UOp]]:
     res.extend(new_stores)
   return res
 
+# compile a UPat into a python function that checks it top down with no allocations and calls fxn with the first match
+# each permutation of a list src is an alternative, and the rest of the pattern is copied into every alternative so failing falls through to the next
+@functools.lru_cache(None)
+def _compile_upat(pat:UPat, fxn:Callable) -> Callable[[UOp], Any]:
+  def fallback(u:UOp) -> Any: return fxn(**matches[0]) if (matches:=_match(u, pat, {})) else None
+  consts: Dict[str, Any] = {"fxn": fxn, "fallback": fallback}
+  def const(x:Any) -> str:
+    consts[nm:=f"c{len(consts)}"] = x
+    return nm
+  cnt = itertools.count(1)
+  def emit(p:UPat, v:str, bound:Dict[str, str], cont:Callable[[Dict[str, str]], List[str]]) -> List[str]:
+    conds = []
+    if p.op is not None: conds.append(f"{v}.op is {const(p.op[0])}" if len(p.op) == 1 else f"{v}.op in {const(p.op)}")
+    if p.dtype is not None: conds.append(f"{v}.dtype in {const(p.dtype)}")
+    if p.arg is not None: conds.append(f"not ({const(p.arg)} != {v}.arg)")
+    if p.name is not None:
+      if p.name in bound: conds.append(f"{v} is {bound[p.name]}")
+      else: bound = {**bound, p.name: v}
+    if p.src is None: body = cont(bound)
+    else:
+      n = len(p.src[0])
+      srcs = [f"u{next(cnt)}" for _ in range(n)]
+      if p.allowed_len != 0: conds.append(f"len({v}.src) == {n}")
+      # with allow_any_len a shorter src only matches a prefix of the pattern, leave that to _match
+      body = ([] if p.allowed_len != 0 else [f"if len({v}.src) < {n}: return fallback(u0)"]) + \
+        [f"{', '.join(srcs)}, = {v}.src{'' if p.allowed_len != 0 else f'[:{n}]'}" if n else "pass"]
+      def chain(pairs:List[Tuple[UPat, str]], b:Dict[str, str]) -> List[str]:
+        return cont(b) if not pairs else emit(pairs[0][0], pairs[0][1], b, lambda nb: chain(pairs[1:], nb))
+      for vp in p.src: body += chain(list(zip(vp, srcs)), bound)
+    return [f"if {' and '.join(conds)}:"] + ["  "+x for x in body] if conds else body
+  def alternatives(p:UPat) -> int:
+    if p.src is None: return 1
+    if isinstance(p.src[0], itertools.repeat): return 1 << 30
+    return sum(prod(alternatives(x) for x in vp) for vp in p.src)
+  # repeated srcs and patterns with too many permutations are matched by _match
+  if alternatives(pat) > 64: return fallback
+  code = emit(pat, "u0", {}, lambda b: [f"return fxn({', '.join(f'{k}={v}' for k,v in b.items())})"])
+  exec("\n".join(["def match(u0):"] + ["  "+x for x in code]), consts)
+  return consts["match"]
+
 class PatternMatcher:
   def __init__(self, patterns:List[Tuple[Union[UPat, UOp], Callable]]):
     self.patterns = patterns
@@ -170,13 +210,20 @@ class PatternMatcher:
       if isinstance(p, UOp): p = UPat.compile(p)
       assert p.op is not None
       for uop in p.op: self.pdict[(uop, p.arg)].append((p, fxn))
+    # the rules for an (op, arg) are tried before the ones for op alone, they are compiled on first use
+    self.rules: Dict[Any, List[Tuple[UPat, Callable]]] = {}
+    for (op,arg),v in self.pdict.items():
+      self.rules[op if arg is None else (op, arg)] = v if arg is None else v + self.pdict.get((op, None), [])
+    self.compiled: Dict[Any, List[Callable[[UOp], Any]]] = {}
 
   @functools.lru_cache(None)  # pylint: disable=method-cache-max-size-none
   def __add__(self, more:PatternMatcher): return PatternMatcher(self.patterns+more.patterns)
 
   def rewrite(self, uop:UOp) -> Optional[UOp]:
-    for p,fxn in itertools.chain(self.pdict[(uop.op, uop.arg)], self.pdict[(uop.op, None)]):
-      if (matches := _match(uop, p, {})) and (ret:=fxn(**matches[0])) is not None: return ret # NOTE: if it returns None, we keep trying to match
+    key = (uop.op, uop.arg) if (uop.op, uop.arg) in self.rules else uop.op
+    if (matchers:=self.compiled.get(key)) is None: matchers = self.compiled[key] = [_compile_upat(p, fxn) for p,fxn in self.rules.get(key, [])]
+    for match in matchers:
+      if (ret:=match(uop)) is not None: return ret # NOTE: if it returns None, we keep trying to match
     return None
 
 def type_verify(uops):
@@ -49,6 +49,7 @@ class BufferOptions:
   nolru: bool = False
 
 class Buffer:
+  __slots__ = "device", "size", "dtype", "options", "offset", "_base", "_lb_refcount", "allocator", "_buf", "__weakref__"
   def __init__(self, device:str, size:int, dtype:DType, opaque:Any=None, options:Optional[BufferOptions]=None,
                initial_value:Optional[bytes]=None, lb_refcount=0, base:Optional[Buffer]=None, offset:int=0, preallocate=False):
     assert isinstance(dtype, DType)
@@ -175,12 +176,22 @@ class CompileError(Exception): pass
 class Compiler:
   def __init__(self, cachekey:Optional[str]=None): self.cachekey = None if getenv("DISABLE_COMPILER_CACHE") else cachekey
   def compile(self, src:str) -> bytes: raise NotImplementedError("need a compile function")
-  def compile_cached(self, src:str) -> bytes:
-    if self.cachekey is None or (lib := diskcache_get(self.cachekey, src)) is None:
-      assert not getenv("ASSERT_COMPILE"), f"tried to compile with ASSERT_COMPILE set\n{src}"
-      lib = self.compile(src)
-      if self.cachekey is not None: diskcache_put(self.cachekey, src, lib)
+  # compilers that can put many kernels in one lib return it here, the runtime finds each kernel in it by name
+  def compile_batch(self, srcs:List[str]) -> Optional[bytes]: return None
+  # the lib each kernel of a batch gets, a compiler can store the batched lib once and give its kernels a reference to it
+  def batch_ref(self, lib:bytes) -> bytes: return lib
+  # compile can run on many threads at once (with PARALLEL_COMPILE), other compilers compile one kernel at a time
+  thread_safe: bool = False
+  def cache_get(self, src:str) -> Optional[bytes]:
+    if self.cachekey is not None and (lib := diskcache_get(self.cachekey, src)) is not None: return lib
+    assert not getenv("ASSERT_COMPILE"), f"tried to compile with ASSERT_COMPILE set\n{src}"
+    return None
+  def cache_put(self, src:str, lib:bytes) -> bytes:
+    if self.cachekey is not None: diskcache_put(self.cachekey, src, lib)
     return lib
+  def compile_cached(self, src:str) -> bytes:
+    if (lib := self.cache_get(src)) is not None: return lib
+    return self.cache_put(src, self.compile(src))
 
 class Compiled:
   def __init__(self, device:str, allocator:Allocator, renderer:Optional[Renderer], compiler:Optional[Compiler], runtime, graph=None):
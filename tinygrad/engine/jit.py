@@ -1,13 +1,13 @@
 from __future__ import annotations
-from typing import TypeVar, Generic, Callable, List, Tuple, Union, Dict, cast, Optional, Any
-import functools, itertools, collections
+from typing import TypeVar, Generic, Callable, List, Tuple, Union, Dict, Set, cast, Optional, Any, DefaultDict
+import functools, itertools, collections, pickle
 from tinygrad.tensor import Tensor
 from tinygrad.lazy import LazyBuffer
 from tinygrad.helpers import flatten, merge_dicts, DEBUG, Context, GRAPH, BEAM, getenv, all_int, GraphException, colored, JIT
 from tinygrad.device import Buffer, Compiled, Device
 from tinygrad.dtype import DType
 from tinygrad.shape.shapetracker import ShapeTracker
-from tinygrad.shape.symbolic import Variable, sint
+from tinygrad.shape.symbolic import Variable, sint, sym_infer
 from tinygrad.engine.realize import ExecItem, capturing, EmptyOp, ViewOp, BufferXfer, CompiledRunner, Runner
 from tinygrad.engine.schedule import _internal_memory_planner
 from tinygrad.nn.state import get_parameters
@@ -90,30 +90,76 @@ class GraphRunner(Runner):  # pylint: disable=abstract-method
 
 class MultiGraphRunner(GraphRunner):  # pylint: disable=abstract-method
   def __init__(self, jit_cache: List[ExecItem], input_rawbuffers: List[Buffer], var_vals: Dict[Variable, int]):
-    self.w_dependency_map: Dict[Any, Any] = {}
-    self.r_dependency_map: Dict[Any, List[Any]] = collections.defaultdict(list)
+    # id of a base buffer -> the (start, end, dependency) of its byte ranges last written and read
+    self.w_dependency_map: DefaultDict[int, List[Tuple[int, int, Any]]] = collections.defaultdict(list)
+    self.r_dependency_map: DefaultDict[int, List[Tuple[int, int, Any]]] = collections.defaultdict(list)
     super().__init__(jit_cache, input_rawbuffers, var_vals)
 
   def _access_resources(self, read, write, new_dependency:Any):
     # To synchronize access to resources, we monitor the necessary prerequisites for accessing each resource,
     # whether for write or read operations. A resource can be accessed by either a single writer or multiple readers.
+    # A resource is a byte range of a base buffer, so views of one base (like a memory planner arena) only wait on the ranges they overlap.
+    def rng(rawbuf:Buffer) -> Tuple[int, int, int]: return id(rawbuf.base._buf), rawbuf.offset, rawbuf.offset+rawbuf.nbytes
     wait_nodes = []
 
-    for rawbuf in read + write:
-      if id(rawbuf.base._buf) in self.w_dependency_map: wait_nodes.append(self.w_dependency_map[id(rawbuf.base._buf)])
-    for rawbuf in write:
-      if id(rawbuf.base._buf) in self.r_dependency_map: wait_nodes.extend(self.r_dependency_map.pop(id(rawbuf.base._buf)))
+    for k,st,en in map(rng, read + write): wait_nodes.extend(dep for dst,den,dep in self.w_dependency_map[k] if dst < en and st < den)
+    for k,st,en in map(rng, write):
+      wait_nodes.extend(dep for dst,den,dep in self.r_dependency_map[k] if dst < en and st < den)
+      # reads inside the written range are ordered before this write now
+      self.r_dependency_map[k] = [x for x in self.r_dependency_map[k] if not (st <= x[0] and x[1] <= en)]
 
-    for rawbuf in read: self.r_dependency_map[id(rawbuf.base._buf)].append(new_dependency)
-    for rawbuf in write: self.w_dependency_map[id(rawbuf.base._buf)] = new_dependency
+    for k,st,en in map(rng, read): self.r_dependency_map[k].append((st, en, new_dependency))
+    for k,st,en in map(rng, write):
+      self.w_dependency_map[k] = [x for x in self.w_dependency_map[k] if not (st <= x[0] and x[1] <= en)] + [(st, en, new_dependency)]
     return list({id(x):x for x in wait_nodes}.values())
 
+class _JitPickler(pickle.Pickler):
+  def __init__(self, f, scratch_buffers:Set[Buffer]):
+    super().__init__(f)
+    self.scratch_buffers = scratch_buffers
+  # scratch buffers are overwritten before they are read, so their contents aren't saved
+  def reducer_override(self, obj):
+    if isinstance(obj, Buffer) and obj in self.scratch_buffers: return Buffer, (obj.device, obj.size, obj.dtype, None, obj.options)
+    return NotImplemented
+
 ReturnType = TypeVar('ReturnType')
+def bucket_pow2(x:int) -> int: return 1 << (x-1).bit_length()
+def bucket_multiple(n:int) -> Callable[[int], int]: return lambda x: n * ((x+n-1)//n)
+
+# the attributes of one capture, TinyJit swaps them when the input signature changes
+_CAPTURE_ATTRS = ("jit_cache", "input_replace", "extra_view_inputs", "buffer_replace", "captured", "captured_input_replace", "scratch_buffers",
+                  "graph_pending", "cnt", "expected_names", "expected_st_vars_dtype_device", "ret")
+
 class TinyJit(Generic[ReturnType]):
-  def __init__(self, fxn:Callable[..., ReturnType]):
-    self.fxn = fxn
+  """
+  Captures the kernels `fxn` runs and replays them on later calls.
+  With `max_captures=0` the inputs must always match the captured ones. Otherwise up to `max_captures` captures are kept, keyed by the input
+  names, shapes, dtypes, devices and variables, a new signature is captured on its first call and the least recently used capture is dropped.
+  With `bucket` (like `bucket_pow2` or `bucket_multiple(64)`), input dims that changed between calls become Variables bound to their size with
+  the upper bound `bucket(size)`, so one capture serves a whole bucket. Dims of the same size share a Variable, Tensor outputs are reshaped
+  back to concrete shapes. Each bucket is its own capture, so `max_captures` defaults to 8 with `bucket`.
+  """
+  def __init__(self, fxn:Callable[..., ReturnType], max_captures:Optional[int]=None, bucket:Optional[Callable[[int], int]]=None):
+    if max_captures is None: max_captures = 0 if bucket is None else 8
+    assert bucket is None or max_captures > 0, "bucket needs a capture per bucket, set max_captures > 0"
+    self.fxn, self.max_captures, self.bucket = fxn, max_captures, bucket
+    self.input_shapes: Dict[Union[int, str], Tuple[sint, ...]] = {}
+    self.dynamic_dims: Set[Tuple[Union[int, str], int]] = set()
     self.reset()
 
+  def bucket_inputs(self, args, kwargs) -> Tuple[Tuple, Dict[str, Any]]:
+    for name,t in itertools.chain(enumerate(args), kwargs.items()):
+      if t.__class__ is not Tensor: continue
+      if len(prev:=self.input_shapes.setdefault(name, t.shape)) == len(t.shape):
+        self.dynamic_dims.update((name, i) for i,(s0,s1) in enumerate(zip(prev, t.shape)) if s0 != s1)
+    if not self.dynamic_dims: return args, kwargs
+    bound: Dict[int, Variable] = {}
+    def bucketed(name, t):
+      if t.__class__ is not Tensor or not any((name, i) in self.dynamic_dims for i in range(len(t.shape))): return t
+      return t.reshape(tuple(bound.setdefault(s, Variable(f"jit_{name}_{i}", 1, max(cast(Callable, self.bucket)(s), s)).bind(s))
+                             if (name, i) in self.dynamic_dims and isinstance(s, int) else s for i,s in enumerate(t.shape)))
+    return tuple(bucketed(i, t) for i,t in enumerate(args)), {k:bucketed(k, t) for k,t in kwargs.items()}
+
   def add_buffer(self, b:Buffer) -> Buffer:
     if found:=self.buffer_replace.get(b, None): return found
     if b.is_allocated() or b.lb_refcount > 0: return b
@@ -127,15 +173,54 @@ class TinyJit(Generic[ReturnType]):
     self.jit_cache.append(ExecItem(ei.prg, [self.add_buffer(buf) for buf in ei.bufs if buf is not None]))
 
   def reset(self):
+    self.captures: collections.OrderedDict[Tuple, Dict[str, Any]] = collections.OrderedDict()
+    self.signature: Optional[Tuple] = None
+    self.reset_capture()
+
+  def reset_capture(self):
+    for k in _CAPTURE_ATTRS:
+      if hasattr(self, k): delattr(self, k)
     self.jit_cache: List[ExecItem] = []
     self.input_replace: Dict[Tuple[int, int], int] = {}
     self.extra_view_inputs: List[Tuple[int, int, str, int, DType]] = []
     self.buffer_replace: WeakKeyDictionary[Buffer, Buffer] = WeakKeyDictionary()
+    # the memory planned jit_cache before graphing, this is what save writes out
+    self.captured: List[ExecItem] = []
+    self.captured_input_replace: Dict[Tuple[int, int], int] = {}
+    self.scratch_buffers: Set[Buffer] = set()
+    self.graph_pending: bool = False
     self.cnt: int = 0
 
+  def save(self, fn:str):
+    """
+    Writes the captured kernels, buffers and expected inputs to `fn`, so `TinyJit.load` can replay them in a new process without tracing.
+    Scratch buffers only keep their size and dtype, other buffers (weights, outputs) are saved with their contents.
+    """
+    assert self.cnt >= 2, "can only save a captured JIT"
+    state = {"captured": self.captured, "captured_input_replace": self.captured_input_replace, "scratch_buffers": self.scratch_buffers,
+             "extra_view_inputs": self.extra_view_inputs, "expected_names": self.expected_names,
+             "expected_st_vars_dtype_device": self.expected_st_vars_dtype_device, "ret": self.ret}
+    with open(fn, "wb") as f: _JitPickler(f, self.scratch_buffers).dump(state)
+
+  @staticmethod
+  def load(fn:str, fxn:Optional[Callable[..., ReturnType]]=None) -> TinyJit[ReturnType]:
+    """
+    Loads a JIT written by `TinyJit.save`. The first call runs the saved kernels directly, `fxn` is never called.
+    """
+    with open(fn, "rb") as f: state = pickle.load(f)
+    ret: TinyJit[ReturnType] = TinyJit(cast(Callable[..., ReturnType], fxn))
+    for k,v in state.items(): setattr(ret, k, v)
+    for ei in ret.captured:
+      for b in ei.bufs:
+        if b is not None: b.ensure_allocated()
+    ret.jit_cache, ret.input_replace = [ExecItem(ei.prg, list(ei.bufs)) for ei in ret.captured], dict(ret.captured_input_replace)
+    ret.graph_pending, ret.cnt = True, 2
+    return ret
+
   def __get__(self, obj, objtype): return functools.partial(self.__call__, obj) # add support for instance methods
 
   def __call__(self, *args, **kwargs) -> ReturnType:
+    if self.bucket is not None: args, kwargs = self.bucket_inputs(args, kwargs)
     input_tensors: List[Tuple[Union[int, str], Tensor]] = \
       [(cast(Union[int, str], name),t) for name,t in itertools.chain(enumerate(args), sorted(kwargs.items())) if t.__class__ is Tensor]
     if input_tensors: Tensor.realize(*[t for _,t in input_tensors])
@@ -147,6 +232,16 @@ class TinyJit(Generic[ReturnType]):
     var_vals: Dict[Variable, int] = merge_dicts([varvals for _,varvals,_,_ in st_varvals_dtype_device] + \
                                                 [dict(v.unbind() for v in itertools.chain(args, kwargs.values()) if isinstance(v, Variable))])
     st_vars_dtype_device = [(x[0], tuple(sorted(x[1].keys(), key=lambda v: v.expr)), x[2], x[3]) for x in st_varvals_dtype_device]
+    if self.max_captures > 0 and (signature:=(tuple(names), tuple(st_vars_dtype_device))) != self.signature:
+      if self.signature is not None: self.captures[self.signature] = {k:getattr(self, k) for k in _CAPTURE_ATTRS if hasattr(self, k)}
+      # a new signature skips jit ignore once something was captured, the one time setup (like realizing weights) already ran
+      recapture = any(c["cnt"] >= 2 for c in self.captures.values())
+      self.reset_capture()
+      if (state:=self.captures.pop(signature, None)) is not None:
+        for k,v in state.items(): setattr(self, k, v)
+      elif recapture: self.cnt = 1
+      self.signature = signature
+      while len(self.captures) >= self.max_captures: self.captures.popitem(last=False)
     if not JIT or self.cnt == 0:
       # jit ignore
       with Context(BEAM=0 if getenv("IGNORE_JIT_FIRST_BEAM") else BEAM.value):
@@ -178,8 +273,13 @@ class TinyJit(Generic[ReturnType]):
       # memory planning (optional)
       # Exclude buffers involved in transfer ops to preserve parallelism.
       noopt_buffers = {b for ji in self.jit_cache if isinstance(ji.prg, BufferXfer) for b in ji.bufs}
+      scratch = {b.base for ji in self.jit_cache for b in ji.bufs if b is not None and not b.base.is_allocated() and b.base.lb_refcount == 0}
       assigned = _internal_memory_planner([cast(List[Buffer], item.bufs) for item in self.jit_cache], noopt_buffers, debug_prefix="JIT ")
       self.jit_cache = [ExecItem(item.prg, [assigned.get(b,b).ensure_allocated() for b in item.bufs if b is not None]) for item in self.jit_cache]
+      self.scratch_buffers = {assigned.get(b,b).base for b in scratch}
+      self.captured = [ExecItem(ei.prg, list(ei.bufs)) for ei in self.jit_cache]
+      self.captured_input_replace = get_input_replace(self.captured, input_buffers)
+      for (j,i) in self.captured_input_replace.keys(): self.captured[j].bufs[i] = None
 
       # Condense the items into a graph executor.
       if JIT < 2: self.jit_cache = apply_graph_to_jit(self.jit_cache, input_buffers, var_vals)
@@ -194,6 +294,12 @@ class TinyJit(Generic[ReturnType]):
       for idx, offset, device, size, dtype in self.extra_view_inputs:
         input_buffers.append(Buffer(device, size, dtype, base=input_buffers[idx], offset=offset).ensure_allocated())
       for (j,i),input_idx in self.input_replace.items(): self.jit_cache[j].bufs[i] = input_buffers[input_idx]
+      # a loaded jit is graphed on its first call, the graph needs the input buffers
+      if self.graph_pending:
+        self.graph_pending = False
+        if JIT < 2:
+          self.jit_cache = apply_graph_to_jit(self.jit_cache, input_buffers, var_vals)
+          self.input_replace = get_input_replace(self.jit_cache, input_buffers)
       if DEBUG >= 1 and len(self.jit_cache) >= 10: print(f"jit execs {len(self.jit_cache)} kernels")
       for ei in self.jit_cache: ei.run(var_vals, jit=True)
 
@@ -201,4 +307,10 @@ class TinyJit(Generic[ReturnType]):
     for (j,i) in self.input_replace.keys(): self.jit_cache[j].bufs[i] = None
 
     self.cnt += 1
+    if self.bucket is not None and self.dynamic_dims:
+      def concrete(t):
+        if t.__class__ is not Tensor or all_int(t.shape): return t
+        return t.reshape(tuple(s if isinstance(s, int) else sym_infer(s.unbind()[0], var_vals) for s in t.shape))
+      if isinstance(self.ret, (list, tuple)): return cast(ReturnType, type(self.ret)(concrete(t) for t in self.ret))
+      return cast(ReturnType, concrete(self.ret))
     return self.ret
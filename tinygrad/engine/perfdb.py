@@ -0,0 +1,44 @@
+# the perf database records the measured time of every executed runner, with PERFDB=<run name> it's saved to the diskcache at exit
+import atexit, math
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, Optional
+from tinygrad.helpers import getenv, diskcache_get, diskcache_put, ansistrip, colored
+
+PERFDB = getenv("PERFDB", "")
+
+@dataclass
+class KernelPerf:
+  name: str
+  device: str
+  opts: Tuple
+  count: int = 0
+  ops: int = 0
+  mem: int = 0
+  total_s: float = 0.0
+  min_s: float = math.inf
+  @property
+  def avg_s(self) -> float: return self.total_s / max(self.count, 1)
+
+perf_stats: Dict[str, KernelPerf] = {}
+
+def record(key:str, name:str, device:str, opts:Tuple, ops:int, mem:int, et:float):
+  if (kp:=perf_stats.get(key)) is None: kp = perf_stats[key] = KernelPerf(ansistrip(name), device, opts)
+  kp.count, kp.ops, kp.mem, kp.total_s, kp.min_s = kp.count+1, kp.ops+ops, kp.mem+mem, kp.total_s+et, min(kp.min_s, et)
+
+def save_run(run:str, stats:Optional[Dict[str, KernelPerf]]=None): diskcache_put("perfdb", run, perf_stats if stats is None else stats)
+def load_run(run:str) -> Dict[str, KernelPerf]:
+  if (stats:=diskcache_get("perfdb", run)) is None: raise KeyError(f"no perfdb run named {run}")
+  return stats
+
+def diff_runs(base:str, new:str, threshold:float=0.1) -> List[Tuple[str, KernelPerf, KernelPerf, float]]:
+  """kernels in both runs whose fastest time in `new` is more than `threshold` slower than in `base`, worst first"""
+  b, n = load_run(base), load_run(new)
+  ret = [(k, b[k], n[k], n[k].min_s / b[k].min_s) for k in b.keys() & n.keys() if b[k].min_s > 0]
+  return sorted([x for x in ret if x[3] > 1 + threshold], key=lambda x: -x[3])
+
+def print_diff(base:str, new:str, threshold:float=0.1):
+  for _, b, n, ratio in diff_runs(base, new, threshold):
+    print(f"{colored(f'{ratio:6.2f}x', 'red')} {n.name:40s} {n.device:8s} {b.min_s*1e6:9.2f}us -> {n.min_s*1e6:9.2f}us  opts {n.opts}")
+
+if PERFDB: atexit.register(save_run, PERFDB)
+
@@ -1,17 +1,22 @@
-from typing import List, Dict, Optional, cast, Generator, Tuple
+from typing import List, Dict, Optional, cast, Generator, Tuple, Callable
 import time, pprint
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, Future
 from dataclasses import dataclass, replace
-from tinygrad.helpers import colored, getenv, DEBUG, GlobalCounters, ansilen, BEAM, NOOPT, all_int, CAPTURING, Metadata, Context, TRACEMETA
+from tinygrad.helpers import colored, getenv, DEBUG, GlobalCounters, ansilen, ansistrip, BEAM, NOOPT, all_int, CAPTURING, Metadata, Context, \
+  TRACEMETA, USE_TC, TC_OPT, TRANSCENDENTAL, DISK_METHOD_CACHE, ASYNC_COPY, BATCH_COMPILE, diskcache_get, diskcache_put
 from tinygrad.ops import MetaOps, LazyOp
 from tinygrad.dtype import dtypes
-from tinygrad.device import Device, Buffer
+from tinygrad.device import Device, Buffer, Compiler, _MallocAllocator
 from tinygrad.shape.symbolic import Variable, sym_infer, sint
 from tinygrad.renderer import Renderer, Program
-from tinygrad.codegen.kernel import Kernel
+from tinygrad.codegen.kernel import Kernel, Opt
 from tinygrad.engine.schedule import ScheduleItem
+from tinygrad.engine import perfdb
 
 # **************** Program Creation ****************
 
+BEAM_CACHE_ONLY = getenv("BEAM_CACHE_ONLY")
 logkerns, logkerns_level = open(getenv("LOGKERNS", ""), "a") if getenv("LOGKERNS", "") else None, getenv("LOGKERNS_LEVEL", 1)
 def get_kernel(renderer:Renderer, ast:LazyOp) -> Kernel:
   if DEBUG >= 5:
@@ -19,7 +24,12 @@ def get_kernel(renderer:Renderer, ast:LazyOp) -> Kernel:
   k = Kernel(ast, opts=renderer).required_optimizations()
   if not NOOPT:
     if not (used_tensor_cores:=k.apply_tensor_cores(getenv("TC", 1))): k.hand_coded_optimizations()
-    if BEAM >= 1:
+    if BEAM >= 1 and BEAM_CACHE_ONLY:
+      # only use tuned opts imported with import_beam_cache, never search at runtime
+      from tinygrad.engine.search import cached_beam_search
+      kc = cached_beam_search(Kernel(ast, opts=renderer).required_optimizations(), BEAM.value, bool(getenv("BEAM_ESTIMATE", 1)))
+      if kc is not None: k = kc
+    elif BEAM >= 1:
       from tinygrad.engine.search import beam_search, time_linearizer, bufs_from_lin
       kb, k_opt = Kernel(ast, opts=renderer).required_optimizations(), k
       rawbufs = bufs_from_lin(kb, allocate=False)
@@ -156,14 +166,73 @@ def get_runner(dname:str, ast:LazyOp) -> CompiledRunner:
   bkey = (dname.split(":")[0], ast, BEAM.value, True)
   if bret:=method_cache.get(bkey):
     method_cache[ckey] = ret = CompiledRunner(replace(bret.p, dname=dname), bret.lib)
+  elif DISK_METHOD_CACHE and (dret:=_disk_method_runner(dname, ast)) is not None: method_cache[ckey] = method_cache[bkey] = ret = dret
   else:
-    prg: Program = get_kernel(Device[dname].renderer, ast).to_program()
+    prg: Program = (k:=get_kernel(Device[dname].renderer, ast)).to_program()
     if hasattr(prg.uops, "_fuzz_paths"):
       from test.external.fuzz_uops import UOpsFuzzerRunner
       return UOpsFuzzerRunner(replace(prg, dname=dname))
     method_cache[ckey] = method_cache[bkey] = ret = CompiledRunner(replace(prg, dname=dname))
+    if DISK_METHOD_CACHE: diskcache_put("method_cache", _disk_method_key(dname, ast), (k.applied_opts, prg, ret.lib))
   return ret
 
+def _disk_method_runner(dname:str, ast:LazyOp) -> Optional[CompiledRunner]:
+  if (val:=diskcache_get("method_cache", _disk_method_key(dname, ast))) is None: return None
+  if DEBUG >= 5: print((ast, val[0]))
+  return CompiledRunner(replace(val[1], dname=dname), val[2])
+
+def _disk_method_key(dname:str, ast:LazyOp) -> Dict:
+  renderer = Device[dname].renderer
+  return {"ast": ast.key, "device": dname.split(":")[0], "suffix": renderer.suffix, "beam": BEAM.value, "noopt": NOOPT.value,
+          "tc": USE_TC.value, "tc_opt": TC_OPT.value, "transcendental": TRANSCENDENTAL.value,
+          "renderer_opts": str((renderer.global_max, renderer.cache_sizes, getenv("CPU_MATMUL", 1), renderer.has_gemm))}
+
+def compile_schedule(schedule:List[ScheduleItem], workers:int):
+  """
+  lower all kernels missing from the method_cache, then compile them on a thread pool before anything runs.
+  lowering (and BEAM) runs serially in this thread, and only compilers that are `thread_safe` use the pool, the others compile serially.
+  """
+  todo: Dict[Tuple[str, LazyOp, int, bool], Program] = {}
+  opts: Dict[Tuple[str, LazyOp, int, bool], List[Opt]] = {}
+  for si in schedule:
+    if si.ast.op is not MetaOps.KERNEL: continue
+    dname = si.outputs[0].device
+    ckey, bkey = (dname, si.ast, BEAM.value, False), (dname.split(":")[0], si.ast, BEAM.value, True)
+    if ckey in method_cache or bkey in method_cache or bkey in todo: continue
+    if DISK_METHOD_CACHE and (dret:=_disk_method_runner(dname, si.ast)) is not None:
+      method_cache[ckey] = method_cache[bkey] = dret
+      continue
+    if hasattr((prg:=(k:=get_kernel(Device[dname].renderer, si.ast)).to_program()).uops, "_fuzz_paths"): continue
+    todo[bkey] = replace(prg, dname=dname)
+    opts[bkey] = k.applied_opts
+  # NOTE: the diskcache is only used from this thread, the pool only runs Compiler.compile and Compiler.compile_batch
+  libs: Dict[Tuple[str, LazyOp, int, bool], bytes] = {}
+  batches: Dict[Compiler, List[Tuple[str, LazyOp, int, bool]]] = defaultdict(list)
+  with ThreadPoolExecutor(workers) as pool:
+    def submit(compiler:Compiler, fxn:Callable, arg) -> Future:
+      if compiler.thread_safe: return pool.submit(fxn, arg)
+      (fut:=Future()).set_result(fxn(arg))
+      return fut
+    futures = {}
+    for bkey,prg in todo.items():
+      compiler = Device[prg.dname].compiler
+      if (lib:=compiler.cache_get(prg.src)) is not None: libs[bkey] = lib
+      elif BATCH_COMPILE and type(compiler).compile_batch is not Compiler.compile_batch: batches[compiler].append(bkey)
+      else: futures[bkey] = submit(compiler, compiler.compile, prg.src)
+    # NOTE: a batched lib is shared by all its kernels, so it's not put in the per kernel compiler cache. each kernel gets a reference to it
+    batch_futures = [(compiler, bkeys, submit(compiler, compiler.compile_batch, [todo[bkey].src for bkey in bkeys]))
+                     for compiler,bkeys in batches.items()]
+    for bkey,fut in futures.items(): libs[bkey] = Device[todo[bkey].dname].compiler.cache_put(todo[bkey].src, fut.result())
+    for compiler,bkeys,bfut in batch_futures:
+      batch_ref = compiler.batch_ref(cast(bytes, bfut.result()))
+      for bkey in bkeys: libs[bkey] = batch_ref
+  for bkey,prg in todo.items():
+    method_cache[(prg.dname, bkey[1], BEAM.value, False)] = method_cache[bkey] = CompiledRunner(prg, libs[bkey])
+    if DISK_METHOD_CACHE: diskcache_put("method_cache", _disk_method_key(prg.dname, bkey[1]), (opts[bkey], prg, libs[bkey]))
+  if DEBUG >= 2 and todo:
+    print(f"compiled {len(futures)} kernels with {workers} workers, {sum(len(x) for x in batches.values())} in {len(batches)} batches, "
+          f"{len(todo)-len(futures)-sum(len(x) for x in batches.values())} from diskcache")
+
 # **************** lowering functions ****************
 
 @dataclass(frozen=True)
@@ -173,7 +242,13 @@ class ExecItem:
   metadata: Optional[List[Metadata]] = None
   def run(self, var_vals:Optional[Dict[Variable, int]]=None, wait=False, jit=False, do_update_stats=True) -> Optional[float]:
     bufs = [cast(Buffer, x) for x in self.bufs] if jit else [cast(Buffer, x).ensure_allocated() for x in self.bufs]
-    et = self.prg(bufs, var_vals if var_vals is not None else {}, wait=wait or DEBUG >= 2)
+    et = self.prg(bufs, var_vals if var_vals is not None else {}, wait=wait or DEBUG >= 2 or bool(perfdb.PERFDB))
+    if perfdb.PERFDB and et is not None:
+      if isinstance(self.prg, CompiledRunner) and self.prg.p.ast_key is not None:
+        key, opts = f"{self.prg.dname.split(':')[0]}:{self.prg.p.ast_key.hex()}", self.prg.p.applied_opts
+      else: key, opts = f"{self.prg.dname.split(':')[0]}:{ansistrip(self.prg.display_name)}", ()
+      perfdb.record(key, self.prg.display_name, self.prg.dname, opts, sym_infer(self.prg.op_estimate, var_vals),
+                    sym_infer(self.prg.mem_estimate, var_vals), et)
     if do_update_stats:
       GlobalCounters.kernel_count += 1
       GlobalCounters.global_ops += (op_est:=sym_infer(self.prg.op_estimate, var_vals))
@@ -219,7 +294,50 @@ def lower_schedule(schedule:List[ScheduleItem]) -> Generator[ExecItem, None, Non
 
 capturing: List = []  # put classes with an add method in here
 
+def _host_device(device:str) -> bool: return device.split(":")[0] in {"DISK", "NPY"} or isinstance(Device[device].allocator, _MallocAllocator)
+
+class CopyQueue:
+  """
+  Runs copies between host memory devices on a background thread. The later items only wait for the pending copies whose buffers they overlap.
+  Copies touching other devices stay on the calling thread, their device APIs aren't safe to use from a second thread.
+  """
+  def __init__(self):
+    self.pool: Optional[ThreadPoolExecutor] = None
+    self.pending: List[Tuple[List[Tuple[Buffer, int, int]], Future]] = []
+  @staticmethod
+  def can_run(ei:ExecItem) -> bool:
+    return type(ei.prg) is BufferCopy and all(b is not None and _host_device(b.device) for b in ei.bufs)
+  def submit(self, ei:ExecItem, var_vals:Optional[Dict[Variable, int]], do_update_stats=True):
+    # allocation stays on this thread, only the copy itself runs on the pool
+    bufs = [cast(Buffer, b).ensure_allocated() for b in ei.bufs]
+    if self.pool is None: self.pool = ThreadPoolExecutor(1)
+    self.pending.append(([(b.base, b.offset, b.offset+b.nbytes) for b in bufs], self.pool.submit(ei.run, var_vals, do_update_stats=False)))
+    if do_update_stats:
+      GlobalCounters.kernel_count += 1
+      GlobalCounters.global_mem += ei.prg.mem_estimate
+  def sync(self, bufs:Optional[List[Optional[Buffer]]]=None):
+    """waits for the pending copies overlapping `bufs`, or for all of them"""
+    if not self.pending: return
+    rngs = [(b.base, b.offset, b.offset+b.nbytes) for b in bufs if b is not None] if bufs is not None else []
+    still_pending = []
+    for copy_rngs, fut in self.pending:
+      if bufs is None or any(b0 is b1 and st0 < en1 and st1 < en0 for b0,st0,en0 in copy_rngs for b1,st1,en1 in rngs): fut.result()
+      else: still_pending.append((copy_rngs, fut))
+    self.pending = still_pending
+
 def run_schedule(schedule:List[ScheduleItem], var_vals:Optional[Dict[Variable, int]]=None, do_update_stats=True):
-  for ei in lower_schedule(schedule):
-    if len(capturing) and CAPTURING: capturing[0].add(ei)
-    ei.run(var_vals, do_update_stats=do_update_stats)
+  if (workers:=getenv("PARALLEL_COMPILE")) > 0 or BATCH_COMPILE: compile_schedule(schedule, max(workers, 1))
+  copies = CopyQueue() if ASYNC_COPY else None
+  try:
+    for ei in lower_schedule(schedule):
+      if len(capturing) and CAPTURING: capturing[0].add(ei)
+      if copies is not None:
+        copies.sync(ei.bufs)
+        if not (len(capturing) and CAPTURING) and CopyQueue.can_run(ei):
+          copies.submit(ei, var_vals, do_update_stats)
+          continue
+      ei.run(var_vals, do_update_stats=do_update_stats)
+  finally:
+    if copies is not None:
+      copies.sync()
+      if copies.pool is not None: copies.pool.shutdown()
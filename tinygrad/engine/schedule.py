@@ -1,13 +1,13 @@
-import sys, pickle, atexit
+import sys, pickle, atexit, heapq, itertools
 from collections import defaultdict, deque
 from dataclasses import dataclass
 from typing import Tuple, List, Dict, Optional, Set, DefaultDict, Union, cast, get_args
-from tinygrad.ops import MetaOps, BufferOps, LazyOp, Op, ReduceOps, ConstBuffer, MemBuffer, UNSAFE_PAD_OPS, UnaryOps, reduce_st
+from tinygrad.ops import MetaOps, BufferOps, LazyOp, Op, ReduceOps, ConstBuffer, MemBuffer, UNSAFE_PAD_OPS, UnaryOps, BinaryOps, reduce_st, exec_alu
 from tinygrad.engine.graph import log_lazybuffer, realized_lazybuffer
-from tinygrad.helpers import GRAPH, DEBUG, MULTIOUTPUT, SAVE_SCHEDULE, FUSE_AS_ONE_KERNEL, FUSE_CONV_BW, GlobalCounters, colored, prod, dedup,\
-    all_int, merge_dicts, getenv, Metadata
+from tinygrad.helpers import GRAPH, DEBUG, MULTIOUTPUT, SAVE_SCHEDULE, FUSE_AS_ONE_KERNEL, FUSE_CONV_BW, SCHEDULE_CACHE, MEMORY_SCHEDULE, \
+    GRAPH_REWRITE, GlobalCounters, colored, prod, dedup, all_int, merge_dicts, getenv, round_up, Metadata
 from tinygrad.shape.symbolic import Variable, sint
-from tinygrad.dtype import ConstType, ImageDType, dtypes
+from tinygrad.dtype import ConstType, DType, ImageDType, dtypes
 from tinygrad.lazy import LazyBuffer
 from tinygrad.shape.shapetracker import ShapeTracker
 from tinygrad.device import Buffer, Device
@@ -213,8 +213,9 @@ def _get_isolated_children(r:LazyBuffer, reduce_for_op:Dict[LazyBuffer, LazyBuff
   for tr in group: _recursive_group(tr, tr.st, tr, children, realizes, reduce_for_op, descendants, cache=set())
   return merge_dicts([group, {} if any(tr in group for tr in descendants) else descendants])
 
-def _graph_schedule(outs:List[LazyBuffer], seen:Set[LazyBuffer]):
-  """create a graph for realizing the outputs"""
+def _get_output_groups(outs:List[LazyBuffer], seen:Set[LazyBuffer]) -> \
+    Tuple[DefaultDict[LazyBuffer, List[LazyBuffer]], Dict[LazyBuffer, None], Dict[LazyBuffer, LazyBuffer]]:
+  """group the LazyBuffers that are realized into kernels, returns the groups, the realizes and the assign targets"""
   # start by just realizing the buffers passed in
   realizes: Dict[LazyBuffer, None] = {x.base:None for x in outs if x.base.realized is None}
   allbufs: Dict[LazyBuffer, None] = {}
@@ -280,7 +281,12 @@ def _graph_schedule(outs:List[LazyBuffer], seen:Set[LazyBuffer]):
   for buf in realizes:
     if buf.realized is not None or buf.op is MetaOps.CONST or buf in seen: continue
     output_groups[reduce_for_op[buf] if buf in reduce_for_op and MULTIOUTPUT else buf].append(buf)
+  return output_groups, realizes, assign_targets
 
+def _graph_schedule(outs:List[LazyBuffer], seen:Set[LazyBuffer]):
+  """create a graph for realizing the outputs"""
+  output_groups, realizes, assign_targets = _get_output_groups(outs, seen)
+  for buf in (x for group in output_groups.values() for x in group):
     # make things that can't be images not images
     if isinstance(buf.dtype, ImageDType) and (prod(buf.shape) != prod(buf.dtype.shape) or
                                               not any(buf.shape[x]%4 == 0 for x in buf.st.unit_stride_axes())):
@@ -313,26 +319,179 @@ def _graph_schedule(outs:List[LazyBuffer], seen:Set[LazyBuffer]):
 
   return graph, in_degree, prescheduled
 
+# *** graph rewrite: CSE and algebraic simplification of the unrealized LazyBuffer graph ***
+
+COMMUTATIVE_OPS = (BinaryOps.ADD, BinaryOps.MUL, BinaryOps.MAX, BinaryOps.CMPNE, BinaryOps.XOR, BinaryOps.AND, BinaryOps.OR)
+
+def _lossless_cast(src:DType, dst:DType) -> bool:
+  """every value of src survives a round trip through dst"""
+  if src == dtypes.bool: return True
+  if dtypes.is_float(src) or dtypes.is_float(dst): return dtypes.is_float(src) and dtypes.is_float(dst) and dst.itemsize > src.itemsize
+  return dst.itemsize > src.itemsize and (dtypes.is_unsigned(src) or not dtypes.is_unsigned(dst))
+
+# x seen through the view v, where x has the shape of v.base
+def _through(x:LazyBuffer, v:LazyBuffer) -> LazyBuffer: return x if v is v.base else x.base._view(x.st + v.st)
+
+# an unrealized base the consumers can read around, the user didn't ask to realize it
+def _can_skip(buf:LazyBuffer) -> bool: return buf.realized is None and not buf.forced_realize
+
+def _simplify_lb(buf:LazyBuffer) -> Optional[LazyBuffer]:
+  # cast to a wider dtype and back is a noop
+  if buf.op is UnaryOps.CAST:
+    if (x:=buf.srcs[0]).base.op is UnaryOps.CAST and _can_skip(x.base) and (y:=x.base.srcs[0]).dtype == buf.dtype:
+      if _lossless_cast(y.dtype, x.dtype): return _through(y, x)
+  # reassociate integer constant chains, (x op c1) op c2 -> x op (c1 op c2)
+  elif buf.op is BinaryOps.ADD or buf.op is BinaryOps.MUL:
+    for inner,c2 in [buf.srcs, buf.srcs[::-1]]:
+      if inner.base.op is not buf.op or not _can_skip(inner.base) or not c2.is_unrealized_unmasked_const(): continue
+      for x,c1 in [inner.base.srcs, inner.base.srcs[::-1]]:
+        if c1.is_unrealized_unmasked_const() and dtypes.is_int(buf.dtype):
+          return (x:=_through(x, inner)).e(buf.op, x.const(exec_alu(buf.op, buf.dtype, [c1.base.arg, c2.base.arg])))
+  # reduce of an expand, every reduced element is the same
+  elif buf.op is ReduceOps.SUM or buf.op is ReduceOps.MAX:
+    if len((x:=buf.srcs[0]).st.views) == 1 and x.st.views[0].mask is None and all(x.st.views[0].strides[i] == 0 for i in buf.arg) and \
+        all_int(x.shape) and buf.dtype != dtypes.bool:
+      ret = x.shrink(tuple((0, 1) if i in buf.arg else (0, s) for i,s in enumerate(x.shape)))
+      return ret if buf.op is ReduceOps.MAX else ret.e(BinaryOps.MUL, ret.const(prod(x.shape[i] for i in buf.arg)))
+  return None
+
+def _rewrite_lb(buf:LazyBuffer, keep:Dict[LazyBuffer, Optional[LazyBuffer]], replace:Dict[LazyBuffer, LazyBuffer], cse:Dict[Tuple, LazyBuffer],
+                visited:Set[LazyBuffer]):
+  if buf in visited or buf.realized is not None: return
+  visited.add(buf)
+  for x in buf.srcs: _rewrite_lb(x.base, keep, replace, cse, visited)
+  # NOTE: the buffer of a VIEW is a view of its src buffer, the src can't change
+  if replace and buf.op is not MetaOps.VIEW and any(x.base in replace for x in buf.srcs):
+    buf.srcs = tuple(x if (r:=replace.get(x.base)) is None else _through(r, x) for x in buf.srcs)
+  if isinstance(buf.op, MetaOps) or buf.forced_realize or buf.contiguous_child is not None or isinstance(buf.dtype, ImageDType): return
+  if (ret:=_simplify_lb(buf)) is not None:
+    if buf not in keep:
+      replace[buf] = ret
+      return
+    # the outputs keep their buffer, they can only take the op of a simplified base
+    if ret is ret.base and ret.realized is None and not isinstance(ret.op, MetaOps):
+      buf.op, buf.arg, buf.srcs = ret.op, ret.arg, ret.srcs
+      keep[buf] = ret
+  # common subexpressions, the srcs are already deduped. the op, arg and srcs determine the device, dtype and shape
+  srcs = (frozenset if buf.op in COMMUTATIVE_OPS else tuple)((x.base, x.st) for x in buf.srcs)
+  if (ret:=cse.setdefault((buf.op, buf.arg, srcs), buf)) is not buf and buf not in keep: replace[buf] = ret
+
+def _rewrite_graph(outs:List[LazyBuffer]) -> int:
+  """
+  rewrite the srcs of the unrealized graph in place, the outputs are kept. returns the number of rewritten LazyBuffers
+  NOTE: the srcs (and the op and arg of simplified outputs) change on the LazyBuffers themselves, other Tensors that hold them see the rewrite
+  """
+  replace: Dict[LazyBuffer, LazyBuffer] = {}
+  visited: Set[LazyBuffer] = set()
+  cse: Dict[Tuple, LazyBuffer] = {}
+  # outputs map to the base they were simplified to
+  keep: Dict[LazyBuffer, Optional[LazyBuffer]] = {x.base:None for x in outs}
+  for out in outs: _rewrite_lb(out.base, keep, replace, cse, visited)
+  return len(replace) + sum(x is not None for x in keep.values())
+
+# *** schedule cache: identical LazyBuffer graphs reuse their ScheduleItems ***
+
+def _recurse_key(buf:LazyBuffer, seen:Set[LazyBuffer], nodes:Dict[LazyBuffer, int], key:List[Tuple]) -> int:
+  if (ret:=nodes.get(buf)) is not None: return ret
+  if isinstance(buf.dtype, ImageDType): raise TypeError("image buffers can change dtype while scheduling")
+  if buf is not buf.base: k: Tuple = (buf.st, _recurse_key(buf.base, seen, nodes, key))
+  elif buf.realized is not None: k = (buf.device, buf.dtype, buf.st)
+  else: k = (buf.device, buf.dtype, buf.st, buf.op, buf.arg, buf.forced_realize, buf in seen, buf.metadata,
+             tuple(_recurse_key(x, seen, nodes, key) for x in buf.srcs))
+  nodes[buf] = len(key)
+  key.append(k)
+  return nodes[buf]
+
+def _graph_key(outs:List[LazyBuffer], seen:Set[LazyBuffer]) -> Optional[Tuple[Tuple, Dict[LazyBuffer, int]]]:
+  """structural key of the unrealized graph, realized buffers are keyed by position. returns None if the graph can't be cached"""
+  nodes: Dict[LazyBuffer, int] = {}
+  key: List[Tuple] = []
+  try:
+    ret = (tuple(_recurse_key(x, seen, nodes, key) for x in outs), FUSE_AS_ONE_KERNEL.value, FUSE_CONV_BW.value, MULTIOUTPUT.value,
+           MEMORY_SCHEDULE.value, tuple(key))
+    hash(ret)
+  except TypeError: return None
+  return ret, nodes
+
+# (ast, output lazybuffer indexes, buffer lazybuffer indexes, metadata) for each ScheduleItem, plus the var_vals
+CachedSchedule = Tuple[List[Tuple[LazyOp, Tuple[int, ...], Tuple[int, ...], Optional[List[Metadata]]]], Dict[Variable, int]]
+schedule_cache: Dict[Tuple, CachedSchedule] = {}
+
+def _log_op(si:ScheduleItem):
+  if not logops or si.ast.op is not MetaOps.KERNEL or any(i.device.startswith("DISK:") for i in si.inputs): return
+  logops.write(str(si.ast).replace("\n", "")+"\n")
+
+def _replay_schedule(cached:CachedSchedule, nodes:Dict[LazyBuffer, int], seen:Set[LazyBuffer]) -> Tuple[List[ScheduleItem], Dict[Variable, int]]:
+  lbs = list(nodes)
+  schedule: List[ScheduleItem] = []
+  for ast, out_idxs, buf_idxs, metadata in cached[0]:
+    for i in out_idxs:
+      seen.add(lbs[i])
+      del lbs[i].srcs  # can only schedule once
+    schedule.append(si:=ScheduleItem(ast, tuple(lbs[i].buffer for i in buf_idxs), metadata))
+    _log_op(si)
+  return schedule, cached[1].copy()
+
 # *** DAG ordering: breadth first search ***
 
 SCHEDULES: List = []
+def _live_bytes_delta(ps, produced:Set[LazyBuffer], keep:Set[LazyBuffer], consumers:Dict[LazyBuffer, int]) -> int:
+  """bytes this kernel allocates minus the bytes of scheduled intermediates it is the last reader of"""
+  return sum(x.buffer.nbytes for x in ps[0] if x.size != 0) - \
+         sum(x.buffer.nbytes for x in dedup(ps[2]) if x in produced and x not in keep and consumers[x] == 1)
+
 def create_schedule_with_vars(outs:List[LazyBuffer], seen:Optional[Set[LazyBuffer]]=None) -> Tuple[List[ScheduleItem], Dict[Variable, int]]:
   if seen is None: seen = set()
+  # the kernels before the rewrite are only counted for the DEBUG report
+  kernels = len(_get_output_groups(outs, seen)[0]) if GRAPH_REWRITE and DEBUG >= 2 else 0
+  GlobalCounters.graph_rewrites += (rewrites:=_rewrite_graph(outs) if GRAPH_REWRITE else 0)
+  cache_key = _graph_key(outs, seen) if SCHEDULE_CACHE and not GRAPH and not SAVE_SCHEDULE else None
+  if cache_key is not None and (cached:=schedule_cache.get(cache_key[0])) is not None:
+    GlobalCounters.schedule_cache_hits += 1
+    return _replay_schedule(cached, cache_key[1], seen)
+  if cache_key is not None: GlobalCounters.schedule_cache_misses += 1
   graph, in_degree, prescheduled = _graph_schedule(outs, seen)
+  if rewrites and DEBUG >= 2: print(f"graph rewrite removed {rewrites} LazyBuffers and {kernels-len(prescheduled)} kernels")
   queue = deque(si for key, si in prescheduled.items() if in_degree[key] == 0)
   schedule: List[ScheduleItem] = []
+  cache_items: List[Tuple[LazyOp, Tuple[int, ...], Tuple[int, ...], Optional[List[Metadata]]]] = []
   var_vals: Dict[Variable, int] = {}
   kernel_number = GlobalCounters.kernel_count
-  while queue:
-    ps = queue.popleft()
+  # with MEMORY_SCHEDULE, the ready kernels are a heap of (live bytes delta, ready order, key). a delta only changes when a buffer the kernel
+  # reads is left with it as the last reader, then the kernel is pushed again and its old entry is stale
+  ready: List[Tuple[int, int, LazyBuffer]] = []
+  deltas: Dict[LazyBuffer, int] = {}
+  if MEMORY_SCHEDULE:
+    produced, keep = {x for ps in prescheduled.values() for x in ps[0]}, {x.base for x in outs}
+    order, orders = itertools.count(), {}
+    readers: DefaultDict[LazyBuffer, List[LazyBuffer]] = defaultdict(list)
+    for key, ps in prescheduled.items():
+      for x in dedup(ps[2]): readers[x].append(key)
+    consumers = {x:len(r) for x,r in readers.items()}
+    def push_ready(key:LazyBuffer):
+      deltas[key] = _live_bytes_delta(prescheduled[key], produced, keep, consumers)
+      heapq.heappush(ready, (deltas[key], orders.setdefault(key, next(order)), key))
+  while queue or deltas:
+    if MEMORY_SCHEDULE:
+      while queue: push_ready(queue.popleft()[0][0])
+      # pick the ready kernel that grows the live bytes the least, ties keep the BFS order
+      while (entry:=heapq.heappop(ready))[0] != deltas.get(entry[2]): pass
+      del deltas[entry[2]]
+      ps = prescheduled[entry[2]]
+      for x in dedup(ps[2]):
+        consumers[x] -= 1
+        if consumers[x] == 1 and (last:=next(k for k in readers[x] if k is not entry[2] and k not in seen)) in deltas: push_ready(last)
+    else: ps = queue.popleft()
     for buf in ps[0]: seen.add(buf)
     if GRAPH:
       kernel_number += 1
       for out in ps[0]: realized_lazybuffer(out, kernel_number)
     var_vals = merge_dicts([var_vals, ps[3]])
     for out in ps[0]: del out.srcs  # can only schedule once
-    schedule.append(si:=ScheduleItem(ps[1], tuple(x.buffer for x in ps[0]+ps[2] if x.size != 0), ps[4]))
-    if logops and si.ast.op is MetaOps.KERNEL and not any(i.device.startswith("DISK:") for i in si.inputs): logops.write(str(si.ast)+"\n")
+    bufs = [x for x in ps[0]+ps[2] if x.size != 0]
+    schedule.append(si:=ScheduleItem(ps[1], tuple(x.buffer for x in bufs), ps[4]))
+    if cache_key is not None: cache_items.append((ps[1], tuple(cache_key[1][x] for x in ps[0]), tuple(cache_key[1][x] for x in bufs), ps[4]))
+    _log_op(si)
     for x in graph[ps[0][0]]:
       in_degree[x] -= 1
       if in_degree[x] == 0: queue.append(prescheduled[x])
@@ -348,6 +507,9 @@ def create_schedule_with_vars(outs:List[LazyBuffer], seen:Optional[Set[LazyBuffe
   if any(degree != 0 for degree in in_degree.values()) or len(prescheduled) != len(schedule):
     raise RuntimeError(f"cycle detected in graph, prescheduled {len(prescheduled)} but only scheduled {len(schedule)}")
   if DEBUG >= 1 and len(schedule) >= 10: print(f"scheduled {len(schedule)} kernels")
+  if cache_key is not None:
+    if len(schedule_cache) >= getenv("SCHEDULE_CACHE_SIZE", 256): del schedule_cache[next(iter(schedule_cache))]
+    schedule_cache[cache_key[0]] = (cache_items, var_vals.copy())
   return schedule, var_vals
 
 def create_schedule(outs:List[LazyBuffer], seen:Optional[Set[LazyBuffer]]=None) -> List[ScheduleItem]:
@@ -357,6 +519,8 @@ def create_schedule(outs:List[LazyBuffer], seen:Optional[Set[LazyBuffer]]=None)
 
 # *** memory planning ***
 
+ARENA_ALIGN = 0x100
+
 def _internal_memory_planner(buffers:List[Union[List[Buffer], Tuple[Buffer, ...]]], noopt_buffers=None, debug_prefix="") -> Dict[Buffer, Buffer]:
   if getenv("NO_MEMORY_PLANNER"): return {}
   first_appearance, last_appearance = {}, {}
@@ -367,33 +531,67 @@ def _internal_memory_planner(buffers:List[Union[List[Buffer], Tuple[Buffer, ...]
       last_appearance[buf.base] = i
 
   # Sort buffers by size in descending order, prioritizing largest buffers for allocation first.
+  # Devices with offset views pack all buffers of a (device, options) into one arena: each buffer takes the smallest free gap left by the placed
+  # buffers whose lifetimes overlap its own, so the dtype doesn't matter. Other devices (and images) can only reuse a buffer of identical nbytes.
   # Track free segments, each containing (start, stop, and buffer that could be reused on this segment).
   free_segs: Dict[Tuple, List[Tuple[int, int, Buffer]]] = defaultdict(list) # Dict[buffer key, Tuple[start, end, buffer to reuse on the seg]]
   def find_replace_buffer(buf, st, en):
-    key = (buf.device, buf.dtype, buf.options) + ((buf.nbytes,) if not hasattr(Device[buf.device].allocator, "offset") else tuple())
+    key = (buf.device, buf.dtype, buf.options, buf.nbytes)
 
     default_buf = (0, len(buffers) - 1, buf) # will return the buffer itself if the replace one is not found.
     seg_st, seg_en, seg_buf = next((free_segs[key].pop(i) for i,(sst,sen,_) in enumerate(free_segs[key]) if sst <= st and en <= sen), default_buf)
 
     free_segs[key] += [(seg_st, st - 1, seg_buf)] if st - 1 >= seg_st else []
     free_segs[key] += [(en + 1, seg_en, seg_buf)] if seg_en >= en + 1 else []
+    return seg_buf
 
-    return seg_buf if seg_buf.nbytes == buf.nbytes else Buffer(buf.device, buf.size, buf.dtype, base=seg_buf)
+  placed: DefaultDict[Tuple, List[Tuple[int, int, int, int]]] = defaultdict(list) # Dict[arena key, List[Tuple[start, end, offset, nbytes]]]
+  def find_arena_offset(buf, st, en) -> int:
+    best, prev_end, key = None, 0, (buf.device, buf.options)
+    for off, nbytes in sorted((off, nbytes) for pst, pen, off, nbytes in placed[key] if pst <= en and st <= pen):
+      if off - (start:=round_up(prev_end, ARENA_ALIGN)) >= buf.nbytes and (best is None or off - start < best[1]): best = (start, off - start)
+      prev_end = max(prev_end, off + nbytes)
+    placed[key].append((st, en, ret:=best[0] if best is not None else round_up(prev_end, ARENA_ALIGN), buf.nbytes))
+    return ret
 
   buffer_requests = sorted([(first_appearance[buf], last_appearance[buf], buf) for buf in first_appearance.keys()], key=lambda x: -x[2].nbytes)
-  assigned = {buf:find_replace_buffer(buf, st, en) for st, en, buf in buffer_requests}
+  assigned, arena_offsets = {}, {}
+  for st, en, buf in buffer_requests:
+    if hasattr(Device[buf.device].allocator, "offset") and not (buf.options is not None and buf.options.image is not None):
+      arena_offsets[buf] = find_arena_offset(buf, st, en)
+    else: assigned[buf] = find_replace_buffer(buf, st, en)
+  # a single buffer has nothing to pack with and keeps its own base
+  arenas = {key:Buffer(key[0], max(off+nbytes for _,_,off,nbytes in p), dtypes.uint8, options=key[1]) for key,p in placed.items() if len(p) > 1}
+  for buf,off in arena_offsets.items():
+    if (key:=(buf.device, buf.options)) in arenas: assigned[buf] = Buffer(buf.device, buf.size, buf.dtype, base=arenas[key], offset=off)
 
   for i,u in enumerate(buffers):
     for buf in u:
       if buf.is_allocated() or buf.lb_refcount > 0 or (noopt_buffers is not None and buf.base in noopt_buffers): continue
-      if buf._base is not None: assigned[buf] = Buffer(buf.device, buf.size, buf.dtype, base=assigned.get(buf.base, buf.base).base, offset=buf.offset)
+      if buf._base is not None:
+        assigned[buf] = Buffer(buf.device, buf.size, buf.dtype, base=(nb:=assigned.get(buf.base, buf.base)).base, offset=nb.offset+buf.offset)
       else: assigned[buf] = assigned.get(buf, buf)
 
-  if DEBUG >= 1 and len(ak:=dedup(x for x in assigned.keys() if x._base is None)) != len(av:=dedup(x for x in assigned.values() if x._base is None)):
-    print(debug_prefix+f"memory reduced from {sum([x.nbytes for x in ak])/1e6:.2f} MB -> {sum([x.nbytes for x in av])/1e6:.2f} MB,",
-          f"{len(ak)} -> {len(av)} bufs")
+  if DEBUG >= 1:
+    ak, av = dedup(x for x in assigned.keys() if x._base is None), dedup(x.base for x in assigned.values())
+    if (naive:=sum(x.nbytes for x in ak)) != (planned:=sum(x.nbytes for x in av)):
+      print(debug_prefix+f"memory reduced from {naive/1e6:.2f} MB -> {planned/1e6:.2f} MB,", f"{len(ak)} -> {len(av)} bufs, {len(arenas)} arenas")
   return assigned
 
+def memory_peak(schedule:List[ScheduleItem]) -> int:
+  """projected peak bytes of the buffers `schedule` allocates, buffers without a LazyBuffer are freed after their last use"""
+  last_use = {b.base:i for i,si in enumerate(schedule) for b in si.bufs}
+  live, peak, allocated = 0, 0, set()
+  for i,si in enumerate(schedule):
+    for b in dedup(x.base for x in si.bufs):
+      if b not in allocated and not b.is_allocated() and not b.device.startswith("DISK"):
+        allocated.add(b)
+        live += b.nbytes
+    peak = max(peak, live)
+    for b in dedup(x.base for x in si.bufs):
+      if b in allocated and last_use[b] == i and b.lb_refcount == 0: live -= b.nbytes
+  return peak
+
 def memory_planner(schedule:List[ScheduleItem]) -> List[ScheduleItem]:
   # Exclude buffers involved in load ops (e.g transfers) to preserve parallelism in graphs.
   assigned = _internal_memory_planner([si.bufs for si in schedule],
@@ -1,16 +1,20 @@
-from typing import Dict, List, cast, DefaultDict, Optional, Tuple, Callable
-import itertools, functools, random, math, time, multiprocessing, traceback, signal
+from typing import Dict, List, cast, DefaultDict, Optional, Tuple, Callable, Any
+import itertools, functools, random, math, time, multiprocessing, traceback, signal, pickle, sqlite3, hashlib
+import numpy as np
 from collections import defaultdict
 from dataclasses import replace
 from tinygrad.device import Device, Buffer, Compiler
-from tinygrad.ops import MemBuffer
-from tinygrad.helpers import prod, flatten, DEBUG, CACHELEVEL, diskcache_get, diskcache_put, getenv, Context, colored, to_function_name
-from tinygrad.dtype import ImageDType
+from tinygrad.ops import LazyOp, MemBuffer, ConstBuffer
+from tinygrad.helpers import prod, flatten, DEBUG, CACHELEVEL, diskcache_get, diskcache_put, getenv, Context, colored, to_function_name, \
+  db_connection, VERSION
+from tinygrad.dtype import ImageDType, DType
 from tinygrad.codegen.kernel import Kernel
 from tinygrad.codegen.kernel import Opt, OptOps, KernelOptError
 from tinygrad.codegen.uopgraph import UOpGraph
+from tinygrad.codegen.uops import UOp, UOps, flops_mem
 from tinygrad.tensor import Tensor
 from tinygrad.shape.symbolic import sym_infer
+from tinygrad.shape.shapetracker import ShapeTracker
 from tinygrad.engine.realize import CompiledRunner
 from tinygrad.renderer import Program
 
@@ -23,6 +27,8 @@ if getenv("BEAM_PADTO", 1): actions += [Opt(op=OptOps.PADTO, axis=axis, amt=amt)
 actions += [Opt(op=OptOps.LOCAL, axis=0, amt=32), Opt(op=OptOps.UPCASTMID, axis=1, amt=4), Opt(op=OptOps.TC, axis=0, amt=0)]
 actions += [Opt(op=OptOps.TC, axis=axis, amt=getenv("TC_OPT", 2)) for axis in range(9)] # covers resnet kernels (3 global * 3 reduce)
 actions += [Opt(op=OptOps.SWAP, axis=axis, amt=amt) for axis in range(5) for amt in range(axis+1, 5)]
+actions += [Opt(op=OptOps.THREAD, axis=axis, amt=amt) for amt in [2,4,8,16,32] for axis in range(3)]
+actions += [Opt(op=OptOps.TILE, axis=axis, amt=amt) for amt in [8,16,32,64] for axis in range(3)]
 if getenv("NOLOCALS"): actions += [Opt(op=OptOps.NOLOCALS)]
 
 def _get_test_global_size(global_size, max_global_size, var_vals):
@@ -117,17 +123,123 @@ def get_kernel_actions(lin:Kernel, include_0=True) -> Dict[int, Kernel]:
     except KernelOptError: pass
   return acted_lins
 
-beam_pool, BEAM_DEBUG = None, getenv("BEAM_DEBUG")
+# *** cost model ***
+
+# log2 of the runtime is modeled as a dot product of these features with the weights, only the ranking within one kernel matters
+# the default is roughly a roofline on the executed loads and alus, with a penalty for strided memory access
+DEFAULT_COST_WEIGHTS = [0.0, 0.25, 1.0, 0.05, -0.05, 0.0, 0.0, 0.5]
+def kernel_features(lin:Kernel, uops:List[UOp]) -> List[float]:
+  var_vals = {k:(k.max+k.min)//2 for k in lin.ast.vars()}
+  flops, mem = [sym_infer(x, var_vals) for x in flops_mem(uops, ignore_indexing=True)]
+  # is the innermost loop walking each buffer with a stride, and how many loads are vectorized
+  loop_axis = lin.shape_len-lin.upcasted-1
+  strided = [not isinstance(st:=lin.sts[i].real_strides()[loop_axis], int) or st not in (0,1) for i in range(len(lin.bufs))] if loop_axis >= 0 else []
+  loads = [u for u in uops if u.op is UOps.LOAD]
+  global_size = sym_infer(prod(lin.full_shape[:lin.global_dims]), var_vals)
+  local_size = sym_infer(prod(lin.full_shape[lin.global_dims:lin.first_reduce]), var_vals)
+  return [1.0, math.log2(flops+1), math.log2(mem+1), math.log2(len(uops)+1), math.log2(global_size), math.log2(local_size),
+          sum(cast(DType, u.dtype).count > 1 for u in loads)/max(len(loads), 1), sum(strided)/max(len(strided), 1)]
+
+def kernel_cost(lin:Kernel, weights:List[float]) -> float:
+  return sum(w*f for w,f in zip(weights, kernel_features(lin, lin.linearize().uops.uops)))
+
+def rank_kernels(lins:List[Kernel], weights:List[float]) -> List[Kernel]:
+  """sorts `lins` by their modeled cost, dropping the ones that fail to lower"""
+  costs: List[Tuple[float, int]] = []
+  for i,lin in enumerate(lins):
+    try: costs.append((kernel_cost(lin, weights), i))
+    except Exception as e:
+      if getenv("BEAM_STRICT_MODE"): raise e
+  return [lins[i] for _,i in sorted(costs)]
+
+def get_cost_weights(device:str, suffix:str) -> List[float]:
+  return diskcache_get("beam_cost_model", {"device": device, "suffix": suffix}) or DEFAULT_COST_WEIGHTS
+
+def record_cost(lin:Kernel, uops:List[UOp], tm:float):
+  key = {"ast": lin.ast.key, "opts": str(lin.applied_opts), "device": lin.opts.device, "suffix": lin.opts.suffix}
+  if not math.isinf(tm): diskcache_put("beam_features", key, (kernel_features(lin, uops), tm))
+
+def train_cost_model(device:str, suffix:str="") -> List[float]:
+  """fits the cost weights of `device` to the timings recorded with BEAM_COST_RECORD, and saves them for beam_search"""
+  try: rows = db_connection().execute(f"SELECT ast, val FROM 'beam_features_{VERSION}' WHERE device=? AND suffix=?", (device, suffix)).fetchall()
+  except sqlite3.OperationalError: rows = []  # table doesn't exist
+  by_ast: DefaultDict[bytes, List[Tuple[List[float], float]]] = defaultdict(list)
+  for ast,val in rows:
+    feats, tm = pickle.loads(val)
+    if tm > 0: by_ast[ast].append((feats, math.log2(tm)))
+  # only the order of the candidates of one kernel matters, so fit the timings relative to the mean of each kernel
+  xs, ys = [], []
+  for samples in by_ast.values():
+    if len(samples) < 2: continue
+    x, y = np.array([f for f,_ in samples]), np.array([t for _,t in samples])
+    xs.append(x - x.mean(0))
+    ys.append(y - y.mean())
+  if not xs: raise RuntimeError(f"no recorded timings for {device}, run BEAM with BEAM_COST_RECORD=1 first")
+  weights = np.linalg.lstsq(np.concatenate(xs), np.concatenate(ys), rcond=None)[0].tolist()
+  diskcache_put("beam_cost_model", {"device": device, "suffix": suffix}, weights)
+  return weights
+
+# *** similar kernels ***
+
+def similar_ast_key(ast:LazyOp) -> bytes:
+  """a key that's the same for kernels that only differ in their sizes (within a power of two), strides and buffer numbering"""
+  bufs: Dict[int, int] = {}
+  def bucket(s) -> int: return 1 << (s-1).bit_length() if isinstance(s, int) and s > 0 else -1
+  def stride(s) -> int: return s if isinstance(s, int) and s in (0,1) else 2
+  def norm_st(st:ShapeTracker): return tuple((tuple(map(bucket, v.shape)), tuple(map(stride, v.strides)), v.mask is not None) for v in st.views)
+  def norm(op:LazyOp) -> Tuple:
+    if isinstance(op.arg, MemBuffer): arg: Any = ("mem", bufs.setdefault(op.arg.idx, len(bufs)), op.arg.dtype, norm_st(op.arg.st))
+    elif isinstance(op.arg, ConstBuffer): arg = ("const", op.arg.dtype, norm_st(op.arg.st))
+    else: arg = op.arg
+    return (op.op, arg, tuple(norm(x) for x in op.src))
+  return hashlib.sha256(str(norm(ast)).encode()).digest()
+
+def get_similar_kernels(lin:Kernel) -> List[Kernel]:
+  """`lin` with the opts BEAM found for similar kernels applied, the ones that don't apply are dropped"""
+  ret = []
+  for opts in diskcache_get("beam_search_similar", {"ast": similar_ast_key(lin.ast), "device": lin.opts.device, "suffix": lin.opts.suffix}) or []:
+    lin2 = lin.copy()
+    try:
+      for o in opts[len(lin.applied_opts):]: lin2.apply_opt(o)
+    except KernelOptError: continue
+    ret.append(lin2)
+  return ret
+
+def _beam_key(lin:Kernel, amt:int, allow_test_size:bool) -> Dict[str, Any]:
+  return {"ast": lin.ast.key, "amt": amt, "allow_test_size": allow_test_size, "device": lin.opts.device, "suffix": lin.opts.suffix}
+
+def cached_beam_search(lin:Kernel, amt:int, allow_test_size=True) -> Optional[Kernel]:
+  if CACHELEVEL < 1 or (val:=diskcache_get("beam_search", _beam_key(lin, amt, allow_test_size))) is None: return None
+  ret = lin.copy()
+  for o in val[len(lin.applied_opts):]: ret.apply_opt(o)
+  return ret
+
+BEAM_COLS = ("ast", "amt", "allow_test_size", "device", "suffix")
+def export_beam_cache(fn:str, device:str, suffix:str="") -> int:
+  """writes the beam_search results of `device` with renderer `suffix` to a bundle that import_beam_cache can load on another machine"""
+  try: rows = db_connection().execute(f"SELECT {', '.join(BEAM_COLS)}, val FROM 'beam_search_{VERSION}' WHERE device=? AND suffix=?",
+                                      (device, suffix)).fetchall()
+  except sqlite3.OperationalError: rows = []  # table doesn't exist
+  with open(fn, "wb") as f: pickle.dump({"version": VERSION, "device": device, "suffix": suffix, "rows": rows}, f)
+  return len(rows)
+
+def import_beam_cache(fn:str) -> int:
+  with open(fn, "rb") as f: bundle = pickle.load(f)
+  if bundle["version"] != VERSION: raise RuntimeError(f"beam bundle {fn} is from cache version {bundle['version']}, expected {VERSION}")
+  for *key, val in bundle["rows"]: diskcache_put("beam_search", dict(zip(BEAM_COLS, key)), pickle.loads(val))
+  return len(bundle["rows"])
+
+beam_pool, BEAM_DEBUG, BEAM_TOPK, BEAM_COST_RECORD = None, getenv("BEAM_DEBUG"), getenv("BEAM_TOPK"), getenv("BEAM_COST_RECORD")
 def beam_search(lin:Kernel, rawbufs:List[Buffer], amt:int, allow_test_size=True, disable_cache=getenv("IGNORE_BEAM_CACHE")) -> Kernel:
   global beam_pool
-  key = {"ast": lin.ast.key, "amt": amt, "allow_test_size": allow_test_size, "device": lin.opts.device, "suffix": lin.opts.suffix}
-  if not disable_cache and CACHELEVEL >= 1 and (val:=diskcache_get("beam_search", key)) is not None:
-    ret = lin.copy()
-    for o in val[len(lin.applied_opts):]: ret.apply_opt(o)
-    return ret
+  key = _beam_key(lin, amt, allow_test_size)
+  if not disable_cache and (ret:=cached_beam_search(lin, amt, allow_test_size)) is not None: return ret
 
   beam: List[Tuple[Kernel, float]] = [(lin, float("inf"))]
   seen_libs = set()
+  # the best opts of similar kernels are timed in the first round, so the search can start from them
+  seeds = get_similar_kernels(lin) if not disable_cache and CACHELEVEL >= 1 else []
+  if BEAM_DEBUG and seeds: print(f"BEAM_SEARCH: seeded with {[k.applied_opts for k in seeds]}")
 
   default_parallel = multiprocessing.cpu_count() if lin.opts.device in {"CUDA", "AMD", "NV"} else 0
   if beam_pool is None and (workers := getenv("PARALLEL", default_parallel)):
@@ -142,8 +254,12 @@ def beam_search(lin:Kernel, rawbufs:List[Buffer], amt:int, allow_test_size=True,
     var_vals = {k:(k.max+k.min)//2 for k in lin.ast.vars()}
     exiting, st = False, time.perf_counter()
     dev = Device[lin.opts.device]
+    cost_weights = get_cost_weights(lin.opts.device, lin.opts.suffix) if BEAM_TOPK else DEFAULT_COST_WEIGHTS
     while not exiting:
       acted_lins: List[Kernel] = flatten([get_kernel_actions(lin, include_0=False).values() for lin,_ in beam])
+      # only compile and time the candidates the cost model likes best
+      if BEAM_TOPK and len(acted_lins) > BEAM_TOPK: acted_lins = rank_kernels(acted_lins, cost_weights)[:BEAM_TOPK]
+      acted_lins, seeds = acted_lins + seeds, []
       timed_lins: List[Tuple[Kernel, float]] = []
       _compile_fn = functools.partial(_try_compile_linearized_w_idx, compiler=dev.compiler)
       for i,proc in (map(_compile_fn, enumerate(acted_lins)) if beam_pool is None else beam_pool.imap_unordered(_compile_fn, enumerate(acted_lins))):
@@ -155,6 +271,7 @@ def beam_search(lin:Kernel, rawbufs:List[Buffer], amt:int, allow_test_size=True,
         try: tms = _time_program(p, lib, var_vals, rawbufs, early_stop=beam[0][1]*3 if len(beam) else 1.0, clear_l2=hasattr(dev, 'invalidate_caches'))
         except RuntimeError: continue # for runtime issues
         timed_lins.append((acted_lins[i], min(tms)))
+        if BEAM_COST_RECORD: record_cost(acted_lins[i], cast(UOpGraph, p.uops).uops, min(tms))
         if BEAM_DEBUG > 1: print(f"{time.perf_counter() - st:7.2f}s: {i:5d} {len(cast(UOpGraph, p.uops).uops):5d} uops {compile_et*1e6:12.2f} us compile/{timed_lins[-1][1]*1e6:12.2f} us run       {len(timed_lins):4d}/{len(acted_lins):4d}         {timed_lins[-1][0].colored_shape()}")  # noqa: E501
         elif DEBUG >= 2: print(f"\r{time.perf_counter() - st:7.2f}s: {timed_lins[-1][1]*1e6:12.2f} us       {len(timed_lins):4d}/{len(acted_lins):4d}         {timed_lins[-1][0].colored_shape()}\033[K", end="")  # noqa: E501
 
@@ -168,7 +285,11 @@ def beam_search(lin:Kernel, rawbufs:List[Buffer], amt:int, allow_test_size=True,
     if beam_pool is not None: beam_pool.terminate()
     raise e
 
-  if CACHELEVEL >= 1: diskcache_put("beam_search", key, beam[0][0].applied_opts)
+  if CACHELEVEL >= 1:
+    diskcache_put("beam_search", key, beam[0][0].applied_opts)
+    similar_key = {"ast": similar_ast_key(lin.ast), "device": lin.opts.device, "suffix": lin.opts.suffix}
+    similar = [beam[0][0].applied_opts] + [x for x in diskcache_get("beam_search_similar", similar_key) or [] if x != beam[0][0].applied_opts]
+    diskcache_put("beam_search_similar", similar_key, similar[:4])
   if BEAM_DEBUG: print(f"BEAM_SEARCH: final tm={beam[0][1]*1e6:0.2f} us, applied_opts={beam[0][0].applied_opts}")
   return beam[0][0]
 
@@ -199,4 +320,5 @@ def time_linearizer(lin:Kernel, rawbufs:List[Buffer], allow_test_size=True, max_
                       max_global_size=max_global_size if allow_test_size else None, clear_l2=clear_l2, cnt=cnt, name=to_function_name(lin.name))
 
   if CACHELEVEL >= 2: diskcache_put("time_linearizer", key, tms)
+  if BEAM_COST_RECORD: record_cost(lin, cast(UOpGraph, p.uops).uops, min(tms))
   return min(tms)
@@ -1,6 +1,6 @@
 from __future__ import annotations
 import os, functools, platform, time, re, contextlib, operator, hashlib, pickle, sqlite3, cProfile, pstats, tempfile, pathlib, string, ctypes, sys
-import itertools, urllib.request, subprocess, shutil, math, json, contextvars
+import itertools, urllib.request, subprocess, shutil, math, json, contextvars, inspect, weakref
 from dataclasses import dataclass
 from typing import Dict, Tuple, Union, List, ClassVar, Optional, Iterable, Any, TypeVar, TYPE_CHECKING, Callable, Sequence
 if TYPE_CHECKING:  # TODO: remove this and import TypeGuard from typing once minimum python supported version is 3.10
@@ -110,6 +110,9 @@ GRAPH, GRAPHPATH, SAVE_SCHEDULE, RING = ContextVar("GRAPH", 0), getenv("GRAPHPAT
 MULTIOUTPUT, PROFILE, PROFILEPATH = ContextVar("MULTIOUTPUT", 1), ContextVar("PROFILE", 0), ContextVar("PROFILEPATH", temp("tinygrad_profile.json"))
 USE_TC, TC_OPT, TRANSCENDENTAL = ContextVar("TC", 1), ContextVar("TC_OPT", 0), ContextVar("TRANSCENDENTAL", 1)
 FUSE_AS_ONE_KERNEL, FUSE_CONV_BW = ContextVar("FUSE_AS_ONE_KERNEL", 0), ContextVar("FUSE_CONV_BW", 0)
+SCHEDULE_CACHE, DISK_METHOD_CACHE = ContextVar("SCHEDULE_CACHE", 0), ContextVar("DISK_METHOD_CACHE", 0)
+MEMORY_SCHEDULE, GRAPH_REWRITE = ContextVar("MEMORY_SCHEDULE", 0), ContextVar("GRAPH_REWRITE", 0)
+ASYNC_COPY, BATCH_COMPILE = ContextVar("ASYNC_COPY", 0), ContextVar("BATCH_COMPILE", 0)
 
 @dataclass(frozen=True)
 class Metadata:
@@ -128,9 +131,63 @@ class GlobalCounters:
   global_mem: ClassVar[int] = 0
   time_sum_s: ClassVar[float] = 0.0
   kernel_count: ClassVar[int] = 0
+  schedule_cache_hits: ClassVar[int] = 0
+  schedule_cache_misses: ClassVar[int] = 0
+  graph_rewrites: ClassVar[int] = 0
   mem_used: ClassVar[int] = 0   # NOTE: this is not reset
   @staticmethod
-  def reset(): GlobalCounters.global_ops, GlobalCounters.global_mem, GlobalCounters.time_sum_s, GlobalCounters.kernel_count = 0,0,0.0,0
+  def reset():
+    GlobalCounters.global_ops, GlobalCounters.global_mem, GlobalCounters.time_sum_s, GlobalCounters.kernel_count = 0,0,0.0,0
+    GlobalCounters.schedule_cache_hits, GlobalCounters.schedule_cache_misses, GlobalCounters.graph_rewrites = 0,0,0
+
+# **************** interned objects ****************
+
+class Interned(type):
+  # frozen dataclasses with this metaclass are hash-consed on their fields, constructing equal fields returns the same object.
+  # the hash is computed once and equality checks identity first. use with @dataclass(frozen=True, eq=False)
+  # NOTE: Variable.bind changes the hash of fields in place, so equality compares the fields and not the cached hash
+  # NOTE: the table holds weak references, an object leaves it when the last reference to it is gone
+  def __new__(mcs, name, bases, ns):
+    def __hash__(self): return self._hash
+    def __eq__(self, x): return self is x or (type(x) is type(self) and self._key == x._key)
+    def __reduce__(self): return type(self), self._key
+    for k,v in [("__hash__", __hash__), ("__eq__", __eq__), ("__reduce__", __reduce__)]: ns.setdefault(k, v)
+    ret = super().__new__(mcs, name, bases, ns)
+    # fields -> weak reference to the object, keyed so the entry is dropped once the object is gone
+    interned: Dict[Tuple, weakref.KeyedRef] = {}
+    def remove(ref:weakref.KeyedRef):
+      if interned.get(ref.key) is ref: del interned[ref.key]
+    ret._interned, ret._remove = interned, remove
+    return ret
+  def __call__(cls, *args, **kwargs):
+    # keyword arguments and defaults are normalized to the positional fields
+    if kwargs or len(args) != len(cls.__dataclass_fields__):
+      (bound:=inspect.signature(cls.__init__).bind(None, *args, **kwargs)).apply_defaults()
+      args = tuple(bound.arguments.values())[1:]
+    if (ref:=cls._interned.get(args)) is None or (ret:=ref()) is None:
+      ret = super().__call__(*args)
+      object.__setattr__(ret, "_key", args)
+      object.__setattr__(ret, "_hash", hash(args))
+      cls._interned[args] = weakref.KeyedRef(ret, cls._remove, args)
+    return ret
+
+# **************** bounded caches ****************
+
+class LRUCaches:
+  caches: ClassVar[Dict[str, Any]] = {}
+  @staticmethod
+  def stats() -> Dict[str, Any]: return {name:fxn.cache_info() for name,fxn in LRUCaches.caches.items()}
+  @staticmethod
+  def clear_all():
+    for fxn in LRUCaches.caches.values(): fxn.cache_clear()
+
+def bounded_cache(name:str, maxsize:int=4096):
+  # an lru_cache that evicts past LRU_CACHE_SIZE_<NAME> (or LRU_CACHE_SIZE) entries, 0 is unbounded. it's in LRUCaches.stats() as name
+  def decorator(fxn):
+    size = getenv(f"LRU_CACHE_SIZE_{name.upper().replace('.', '_')}", getenv("LRU_CACHE_SIZE", maxsize))
+    LRUCaches.caches[name] = ret = functools.lru_cache(maxsize=size or None)(fxn)
+    return ret
+  return decorator
 
 # **************** timer and profiler ****************
 
@@ -193,7 +250,7 @@ _cache_dir: str = getenv("XDG_CACHE_HOME", os.path.expanduser("~/Library/Caches"
 CACHEDB: str = getenv("CACHEDB", os.path.abspath(os.path.join(_cache_dir, "tinygrad", "cache.db")))
 CACHELEVEL = getenv("CACHELEVEL", 2)
 
-VERSION = 16
+VERSION = 17
 _db_connection = None
 def db_connection():
   global _db_connection
@@ -272,6 +329,12 @@ def cpu_time_execution(cb, enable):
   cb()
   if enable: return time.perf_counter()-st
 
+def cpu_cache_sizes() -> Tuple[int, int]:
+  # L1d and L2 in bytes, sysconf only knows them on linux
+  try: l1, l2 = os.sysconf("SC_LEVEL1_DCACHE_SIZE"), os.sysconf("SC_LEVEL2_CACHE_SIZE")
+  except (ValueError, OSError): l1, l2 = 0, 0
+  return (getenv("CPU_L1", l1 if l1 > 0 else 32768), getenv("CPU_L2", l2 if l2 > 0 else 1048576))
+
 def cpu_objdump(lib):
   with tempfile.NamedTemporaryFile(delete=True) as f:
     pathlib.Path(f.name).write_bytes(lib)
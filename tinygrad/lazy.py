@@ -14,7 +14,7 @@ def create_lazybuffer(device:str, st:ShapeTracker, dtype:DType, op:Optional[Op]=
   if st.size == 0: op, arg, srcs, base = MetaOps.CONST, 0, (), None
   if op is MetaOps.CONST: arg, enable_cache = dtypes.as_const(arg, dtype) if not isinstance(arg, Variable) else arg, True
 
-  cache_key = (device, st, dtype, op, arg, tuple(ref(x) for x in srcs)) if base is None else (st, ref(base))
+  cache_key = (device, st, dtype, op, arg, *[ref(x) for x in srcs]) if base is None else (st, ref(base))
   if enable_cache and (rret := lazycache.get(cache_key, None)): return rret
 
   ret = LazyBuffer(device, st, dtype, op, arg, srcs, base=base, metadata=_METADATA.get())
@@ -23,6 +23,9 @@ def create_lazybuffer(device:str, st:ShapeTracker, dtype:DType, op:Optional[Op]=
 
 view_supported_devices = {"LLVM", "CLANG", "CUDA", "NV", "AMD", "METAL", "DISK"}
 class LazyBuffer:
+  # NOTE: srcs and buffer are deleted/unset to mark realized, hasattr works the same on unset slots
+  __slots__ = "device", "st", "dtype", "shape", "size", "metadata", "_base", "op", "arg", "srcs", "buffer", "contiguous_child", "forced_realize", \
+              "node_id", "__weakref__"  # node_id is set by GRAPH
   def __init__(self, device:str, st:ShapeTracker, dtype:DType,
                op:Optional[Op]=None, arg:Any=None, srcs:Tuple[LazyBuffer, ...]=(),
                base:Optional[LazyBuffer]=None, metadata:Optional[Metadata]=None):
@@ -50,6 +50,7 @@ class KernelInfo:
   local_dims: int = 0           # number of local dimensions  (this is remapping RANGE to SPECIAL)
   upcasted: int = 0             # count that are upcasted     (this is remapping RANGE to EXPAND)
   dont_use_locals: bool = False # don't use local indexing
+  threaded: bool = False        # first axis is split across cpu threads (this is remapping RANGE to SPECIAL)
 
 @dataclass(frozen=True, eq=False)
 class LazyOp:
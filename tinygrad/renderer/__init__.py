@@ -15,6 +15,17 @@ class TensorCore: # D = A * B + C, A is (M x K), B is (K x N), C and D are (M x
   thread_local_sizes: List[List[int]] # in each thread, the number of elements stored in registers for each TC dim
   def __str__(self): return "_".join(["WMMA"] + list(map(str, self.dims)) + [self.dtype_in.name, self.dtype_out.name])
 
+@dataclass(frozen=True)
+class Gemm: # C = A * B for each batch, A is (M x K), B is (K x N), C is (M x N)
+  batch: int
+  M: int
+  N: int
+  K: int
+  # (buffer idx, offset, strides) of each buffer, the strides are over (batch, M, K) for A, (batch, K, N) for B and (batch, M, N) for C
+  c: Tuple[int, int, Tuple[int, int, int]]
+  a: Tuple[int, int, Tuple[int, int, int]]
+  b: Tuple[int, int, Tuple[int, int, int]]
+
 @dataclass(frozen=True)
 class Program:
   name:str
@@ -26,6 +37,9 @@ class Program:
   op_estimate:sint=0
   mem_estimate:sint=0
   lds_estimate:sint=0
+  # what was lowered, for the perf database
+  ast_key:Optional[bytes]=None
+  applied_opts:Tuple=()
 
   @functools.cached_property
   def vars(self) -> List[Variable]: return [] if self.uops is None else self.uops.vars()
@@ -51,6 +65,9 @@ class Renderer:
   supports_float4: bool = True
   has_local: bool = True
   has_shared: bool = True
+  has_threads: bool = False # global_max[0] is the number of cpu threads a kernel can be split over
+  cache_sizes: Optional[Tuple[int, int]] = None # (L1, L2) bytes of a cpu, used to pick register blocks and tiles
+  has_gemm: bool = False # matmuls are rendered with render_gemm instead of the uops
   # NOTE: these two should be in (x,y,z) order to match the max_sizes argument in get_grouped_dims
   global_max: Optional[Tuple[int, ...]] = (0x8FFFFFFF,) * (3) # TODO: UOps.SPECIAL int32 indexes right now
   local_max: Optional[Tuple[int, ...]] = (0x8FFFFFFF,) * (3) # TODO: UOps.SPECIAL int32 indexes right now
@@ -58,3 +75,5 @@ class Renderer:
   tensor_cores: List[TensorCore] = []
 
   def render(self, name:str, uops:UOpGraph) -> str: raise NotImplementedError("needs a renderer")
+  # the buffers and threads of a native gemm kernel come from the uops
+  def render_gemm(self, name:str, gemm:Gemm, uops:UOpGraph) -> str: raise NotImplementedError("needs a gemm renderer")
@@ -2,11 +2,11 @@ from typing import Dict, List, Optional, Tuple, Union, DefaultDict, cast, Litera
 import os, math
 from collections import defaultdict, Counter
 from tinygrad.ops import UnaryOps, BinaryOps, TernaryOps
-from tinygrad.helpers import strip_parens, getenv, prod, dedup
+from tinygrad.helpers import strip_parens, getenv, prod, dedup, cpu_cache_sizes, round_up
 from tinygrad.dtype import ImageDType, dtypes, DType, PtrDType, ConstType
 from tinygrad.codegen.uops import UOps, UOp
 from tinygrad.codegen.uopgraph import UOpGraph
-from tinygrad.renderer import Renderer, TensorCore
+from tinygrad.renderer import Renderer, TensorCore, Gemm
 
 class CStyleLanguage(Renderer):
   kernel_prefix: str = ""
@@ -20,6 +20,7 @@ class CStyleLanguage(Renderer):
   code_for_workitem: Dict[Union[Literal["g"], Literal["l"], Literal["i"]], Callable] = {}
   extra_args: List[str] = []
   float4: Optional[str] = None
+  gep_arr_threshold: int = 4 # vectors wider than this are indexed with [] instead of .xyzw
   uses_vload: bool = False
   uses_ptr_arithmetic: bool = False
   type_map: Dict[DType, str] = {}
@@ -176,21 +177,80 @@ class CStyleLanguage(Renderer):
         elif uop is UOps.GEP:
           assert src[0].dtype is not None
           from_ssa = src[0].op in {UOps.LOAD, UOps.WMMA, UOps.DEFINE_ACC}
-          r[u] = (r[src[0]] if from_ssa else f"{(r[src[0]])}") + (f"[{args}]" if src[0].dtype.count > 4 else f".{'xyzw'[args]}")
+          r[u] = (r[src[0]] if from_ssa else f"{(r[src[0]])}") + (f"[{args}]" if src[0].dtype.count > self.gep_arr_threshold else f".{'xyzw'[args]}")
         else: raise RuntimeError(f"failed to render {u}")
 
     return self.render_kernel(name, kernel, bufs, uops)
 
+CLANG_THREADS = getenv("CLANG_THREADS", 0)
+
 class ClangRenderer(CStyleLanguage):
   device = "CLANG"
-  supports_float4 = False
   has_local = False
-  global_max = None
+  has_threads = CLANG_THREADS > 1
+  global_max = (CLANG_THREADS,) if CLANG_THREADS > 1 else None
+  cache_sizes = cpu_cache_sizes()
+  has_gemm = bool(getenv("CPU_GEMM", 1))
 
   # language options
   buffer_suffix = " restrict"
+  gep_arr_threshold = 0
   type_map = {dtypes.bool:"_Bool", dtypes.half:"__fp16"}
   code_for_op = {**CStyleLanguage().code_for_op, BinaryOps.MAX: lambda a,b,dtype: f"(({a}>{b})?{a}:{b})"}
+  code_for_workitem = {"g": lambda x: "core_id"}
+
+  # vectors are gcc/clang vector extension types, aligned like their scalar and allowed to alias it so buffers can be read through them
+  def render_dtype(self, var_dtype:DType) -> str:
+    return f"{super().render_dtype(var_dtype.scalar())}{var_dtype.count}" if var_dtype.count > 1 else super().render_dtype(var_dtype)
+  def render_vector_prefix(self, dt:DType) -> str:
+    return f"typedef {self.render_dtype(dt.scalar())} {self.render_dtype(dt)} __attribute__((aligned({dt.scalar().itemsize}),vector_size({dt.itemsize}),may_alias));"  # noqa: E501
+  def render_vectorize(self, x:List[str], var_dtype:DType) -> str:
+    assert len(x) == var_dtype.count, f"cast is wrong size {len(x)} != {var_dtype.count}"
+    return f"(({self.render_dtype(var_dtype)}){{{','.join(x)}}})"
+
+  def render_kernel(self, function_name, kernel, bufs, uops, prefix=None) -> str:
+    # threaded kernels take the thread index as the last argument
+    if any(u.op is UOps.SPECIAL for u in uops): bufs = bufs + [("core_id", (dtypes.int, False))]
+    vec_dtypes = dedup(u.dtype for u in uops if u.dtype is not None and u.dtype.count > 1)
+    prefix = dedup((prefix or []) + [self.render_vector_prefix(dt) for dt in vec_dtypes])
+    return super().render_kernel(function_name, kernel, bufs, uops, prefix or None)
+
+  # packed and blocked like extra/gemm/gemm.c: B is packed in L2 sized (KC x NC) panels, A in (MC x KC) panels and a (MR x NR) block of C is
+  # accumulated in registers. threads split the rows of C
+  def render_gemm(self, name:str, gemm:Gemm, uops:UOpGraph) -> str:
+    assert self.cache_sizes is not None, "gemm needs the cache sizes"
+    MR, NR, vec = 6, 16, 8
+    threads = next((u.arg[1] for u in uops if u.op is UOps.SPECIAL), 1)
+    KC = min(gemm.K, max(64, self.cache_sizes[0] // 2 // ((MR+NR) * 4)))
+    MT = round_up(-(-gemm.M // threads), MR)
+    MC, NC = min(MT, max(MR, self.cache_sizes[1] // 2 // (KC * 4) // MR * MR)), min(round_up(gemm.N, NR), 2048)
+    (c, coff, (cs_b, cs_m, cs_n)), (a, aoff, (as_b, as_m, as_k)), (b, boff, (bs_b, bs_k, bs_n)) = gemm.c, gemm.a, gemm.b
+    acc = [[f"c{i}_{j}" for j in range(NR//vec)] for i in range(MR)]
+    kernel = [f"float* bp = (float*)aligned_alloc(64, {round_up(KC*NC*4, 64)});", f"float* ap = (float*)aligned_alloc(64, {round_up(MC*KC*4, 64)});",
+      f"int m0 = {'core_id' if threads > 1 else '0'}*{MT}; int m1 = m0+{MT} < {gemm.M} ? m0+{MT} : {gemm.M};",
+      f"for (int bi = 0; bi < {gemm.batch}; bi++) {{",
+      f"  const float* A = data{a}+{aoff}+bi*{as_b}; const float* B = data{b}+{boff}+bi*{bs_b}; float* C = data{c}+{coff}+bi*{cs_b};",
+      f"  for (int jc = 0; jc < {gemm.N}; jc += {NC}) {{", f"    int nc = {gemm.N}-jc < {NC} ? {gemm.N}-jc : {NC};",
+      f"    for (int pc = 0; pc < {gemm.K}; pc += {KC}) {{", f"      int kc = {gemm.K}-pc < {KC} ? {gemm.K}-pc : {KC};",
+      f"      for (int jr = 0; jr < nc; jr += {NR}) for (int k = 0; k < kc; k++) for (int j = 0; j < {NR}; j++)",
+      f"        bp[jr*kc+k*{NR}+j] = jr+j < nc ? B[(pc+k)*{bs_k}+(jc+jr+j)*{bs_n}] : 0.0f;",
+      f"      for (int ic = m0; ic < m1; ic += {MC}) {{", f"        int mc = m1-ic < {MC} ? m1-ic : {MC};",
+      f"        for (int ir = 0; ir < mc; ir += {MR}) for (int k = 0; k < kc; k++) for (int i = 0; i < {MR}; i++)",
+      f"          ap[ir*kc+k*{MR}+i] = ir+i < mc ? A[(ic+ir+i)*{as_m}+(pc+k)*{as_k}] : 0.0f;",
+      f"        for (int jr = 0; jr < nc; jr += {NR}) for (int ir = 0; ir < mc; ir += {MR}) {{",
+      f"          const float* pa = ap+ir*kc; const float{vec}* pb = (const float{vec}*)(bp+jr*kc);",
+      f"          float{vec} {', '.join(f'{x} = {{0}}' for row in acc for x in row)};",
+      "          for (int k = 0; k < kc; k++) {",
+      f"            {' '.join(f'float{vec} b{j} = pb[k*{NR//vec}+{j}];' for j in range(NR//vec))}",
+      *[f"            {' '.join(f'{x} += pa[k*{MR}+{i}]*b{j};' for j,x in enumerate(row))}" for i,row in enumerate(acc)],
+      "          }",
+      f"          float t[{MR*NR}];",
+      *[f"          {' '.join(f'*(float{vec}*)(t+{i*NR+j*vec}) = {x};' for j,x in enumerate(row))}" for i,row in enumerate(acc)],
+      f"          for (int i = 0; i < {MR} && ir+i < mc; i++) for (int j = 0; j < {NR} && jr+j < nc; j++) {{",
+      f"            float* o = C+(ic+ir+i)*{cs_m}+(jc+jr+j)*{cs_n};", f"            *o = pc == 0 ? t[i*{NR}+j] : *o+t[i*{NR}+j];",
+      "          }", "        }", "      }", "    }", "  }", "}", "free(ap); free(bp);"]
+    bufs = [(f"data{u.arg[0]}", (u.dtype, u.arg[1])) for u in uops if u.op is UOps.DEFINE_GLOBAL]
+    return self.render_kernel(name, ["  "+x for x in kernel], bufs, uops, ["#include <stdlib.h>", self.render_vector_prefix(dtypes.float.vec(vec))])
 
 class OpenCLRenderer(CStyleLanguage):
   device = "GPU"
@@ -64,11 +64,15 @@ def cast(bb, val, input_type, output_type, bitcast=False):
 
   raise NotImplementedError(f"cast from {input_type} -> {output_type} not implemented")
 
-def const(args, dtype): return ir.Constant(dtype_to_llvm_dtype[dtype], args)
+def ldt(dtype:DType): return ir.VectorType(dtype_to_llvm_dtype[dtype.scalar()], dtype.count) if dtype.count > 1 else dtype_to_llvm_dtype[dtype]
+
+def const(args, dtype): return ir.Constant(ldt(dtype), [args]*dtype.count if dtype.count > 1 else args)
+
+# vector loads and stores go through a pointer to <N x T>, only aligned like the scalar
+def vptr(bb, ptr, dtype:DType): return bb[-1].bitcast(ptr, ldt(dtype).as_pointer()) if dtype.count > 1 else ptr
 
 class LLVMRenderer(Renderer):
   device = "LLVM"
-  supports_float4 = False
   has_local = False
   has_shared = False
   global_max = None
@@ -99,12 +103,12 @@ class LLVMRenderer(Renderer):
     for u in uops:
       uop,dtype,src,args = u.op,u.dtype,u.src,u.arg
       if uop is UOps.STORE:
-        element = cast(bb, lvars[src[2]], src[2].dtype, src[0].dtype)
+        element = cast(bb, lvars[src[2]], src[2].dtype, src[0].dtype) if src[2].dtype.count == 1 else lvars[src[2]]
         if len(src) > 3:
           with bb[-1].if_then(lvars[src[3]]):
-            bb[-1].store(element, bb[-1].gep(lvars[src[0]], [lvars[src[1]]], inbounds=True))
+            bb[-1].store(element, vptr(bb, bb[-1].gep(lvars[src[0]], [lvars[src[1]]], inbounds=True), src[2].dtype), align=src[0].dtype.itemsize)
         else:
-          bb[-1].store(element, bb[-1].gep(lvars[src[0]], [lvars[src[1]]], inbounds=True))
+          bb[-1].store(element, vptr(bb, bb[-1].gep(lvars[src[0]], [lvars[src[1]]], inbounds=True), src[2].dtype), align=src[0].dtype.itemsize)
       elif uop is UOps.ENDRANGE:
         loop_entry_bb, phis = loop_blocks.pop()
         idx_p1 = bb[-1].add(lvars[src[0]], ir.Constant(ir.IntType(32), 1))
@@ -121,7 +125,7 @@ class LLVMRenderer(Renderer):
           phis = []
           for rp in reduce_phis:
             incoming = lvars[rp]
-            lvars[rp] = bb[-1].phi(dtype_to_llvm_dtype[rp.dtype])
+            lvars[rp] = bb[-1].phi(ldt(rp.dtype))
             lvars[rp].add_incoming(incoming, bb[-2].block)
             phis.append((rp, lvars[rp]))
 
@@ -134,10 +138,10 @@ class LLVMRenderer(Renderer):
         elif uop is UOps.LOAD:
           if len(src) > 2:
             aug_idx = bb[-1].select(lvars[src[2]], lvars[src[1]], ir.Constant(ir.IntType(32), 0))
-            val = bb[-1].load(bb[-1].gep(lvars[src[0]], [aug_idx], inbounds=True))
+            val = bb[-1].load(vptr(bb, bb[-1].gep(lvars[src[0]], [aug_idx], inbounds=True), dtype), align=src[0].dtype.itemsize)
             val = bb[-1].select(lvars[src[2]], val, lvars[src[3]])
           else:
-            val = bb[-1].load(bb[-1].gep(lvars[src[0]], [lvars[src[1]]], inbounds=True))
+            val = bb[-1].load(vptr(bb, bb[-1].gep(lvars[src[0]], [lvars[src[1]]], inbounds=True), dtype), align=src[0].dtype.itemsize)
           lvars[u] = val
         elif uop is UOps.PHI:
           lvars[u] = lvars[src[1]]
@@ -148,6 +152,10 @@ class LLVMRenderer(Renderer):
         elif uop is UOps.ALU:
           lvars[u] = code_for_op[args](bb[-1], *[lvars[x] for x in src], dtype if args not in (BinaryOps.CMPLT, BinaryOps.CMPNE) else src[0].dtype)
         elif uop in {UOps.CAST, UOps.BITCAST}: lvars[u] = cast(bb, lvars[src[0]], src[0].dtype, dtype, bitcast=uop is UOps.BITCAST)
+        elif uop is UOps.VECTORIZE:
+          lvars[u] = ir.Constant(ldt(dtype), ir.Undefined)
+          for i,x in enumerate(src): lvars[u] = bb[-1].insert_element(lvars[u], lvars[x], ir.Constant(ir.IntType(32), i))
+        elif uop is UOps.GEP: lvars[u] = bb[-1].extract_element(lvars[src[0]], ir.Constant(ir.IntType(32), args))
         elif uop in {UOps.DEFINE_GLOBAL, UOps.DEFINE_VAR}: lvars[u] = func.args[buf_index[args]]
         elif uop is UOps.CONST: lvars[u] = const(args, dtype)
         else: raise RuntimeError(f"failed to render {uop}")
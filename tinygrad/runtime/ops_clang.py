@@ -1,26 +1,61 @@
-import ctypes, subprocess, pathlib, tempfile
+import ctypes, subprocess, pathlib, tempfile, functools, hashlib, os
+from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
 from tinygrad.device import Compiled, Compiler, MallocAllocator
-from tinygrad.helpers import cpu_time_execution, DEBUG, cpu_objdump
-from tinygrad.renderer.cstyle import ClangRenderer
+from tinygrad.helpers import cpu_time_execution, DEBUG, cpu_objdump, dedup, diskcache_get, diskcache_put
+from tinygrad.renderer.cstyle import ClangRenderer, CLANG_THREADS
 
 class ClangCompiler(Compiler):
+  thread_safe = True
   def compile(self, src:str) -> bytes:
+    args = ['clang', '-include', 'tgmath.h', '-shared', '-march=native', '-O2', '-Wall', '-Werror', '-x', 'c', '-fPIC', '-', '-o']
+    if hasattr(os, "memfd_create"):
+      # clang can't seek on /dev/stdout, so it writes to an in memory file it inherits
+      fd = os.memfd_create("clang_out")
+      try:
+        subprocess.check_output(args + [f"/proc/self/fd/{fd}"], input=src.encode('utf-8'), pass_fds=(fd,))
+        return pathlib.Path(f"/proc/self/fd/{fd}").read_bytes()
+      finally: os.close(fd)
     # TODO: remove file write. sadly clang doesn't like the use of /dev/stdout here
     with tempfile.NamedTemporaryFile(delete=True) as output_file:
-      subprocess.check_output(['clang', '-include', 'tgmath.h', '-shared', '-march=native', '-O2', '-Wall', '-Werror', '-x', 'c', '-fPIC', '-',
-                               '-o', str(output_file.name)], input=src.encode('utf-8'))
+      subprocess.check_output(args + [str(output_file.name)], input=src.encode('utf-8'))
       return pathlib.Path(output_file.name).read_bytes()
+  def compile_batch(self, srcs:List[str]) -> bytes: return self.compile('\n'.join(dedup(srcs)))
+  def batch_ref(self, lib:bytes) -> bytes:
+    # the batched lib is stored once under its digest and loaded once, each kernel only holds the digest
+    diskcache_put("clang_batch", digest:=hashlib.sha256(lib).hexdigest(), lib)
+    if digest not in batched_libs: batched_libs[digest] = _load_lib(lib)
+    return BATCH_REF + digest.encode()
+
+# a batched lib holds many kernels, each of them is found by name. like the method_cache, the loaded libs are kept for the process
+BATCH_REF = b"clang_batch:"
+batched_libs: Dict[str, ctypes.CDLL] = {}
+
+def _load_lib(lib:bytes) -> ctypes.CDLL:
+  # write to disk so we can load it
+  with tempfile.NamedTemporaryFile(delete=True) as cached_file_path:
+    pathlib.Path(cached_file_path.name).write_bytes(lib)
+    return ctypes.CDLL(str(cached_file_path.name))
+
+def _load_batch(digest:str) -> ctypes.CDLL:
+  if (ret:=batched_libs.get(digest)) is not None: return ret
+  if (lib:=diskcache_get("clang_batch", digest)) is None: raise RuntimeError(f"batched lib {digest} is not in the diskcache")
+  batched_libs[digest] = ret = _load_lib(lib)
+  return ret
 
 class ClangProgram:
   def __init__(self, name:str, lib:bytes):
-    if DEBUG >= 6: cpu_objdump(lib)
+    if DEBUG >= 6 and not lib.startswith(BATCH_REF): cpu_objdump(lib)
     self.name, self.lib = name, lib
-    # write to disk so we can load it
-    with tempfile.NamedTemporaryFile(delete=True) as cached_file_path:
-      pathlib.Path(cached_file_path.name).write_bytes(lib)
-      self.fxn = ctypes.CDLL(str(cached_file_path.name))[name]
+    self.fxn = (_load_batch(lib[len(BATCH_REF):].decode()) if lib.startswith(BATCH_REF) else _load_lib(lib))[name]
+
+  def __call__(self, *bufs, global_size=None, local_size=None, vals=(), wait=False):
+    if global_size is None: return cpu_time_execution(lambda: self.fxn(*bufs, *vals), enable=wait)
+    # threaded kernel, ctypes releases the GIL so each core_id runs in parallel
+    return cpu_time_execution(lambda: list(_thread_pool().map(lambda core_id: self.fxn(*bufs, *vals, core_id), range(global_size[0]))), enable=wait)
 
-  def __call__(self, *bufs, vals=(), wait=False): return cpu_time_execution(lambda: self.fxn(*bufs, *vals), enable=wait)
+@functools.lru_cache(None)
+def _thread_pool() -> ThreadPoolExecutor: return ThreadPoolExecutor(CLANG_THREADS or None, thread_name_prefix="clang")
 
 class ClangDevice(Compiled):
   def __init__(self, device:str):
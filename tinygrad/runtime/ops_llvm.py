@@ -1,5 +1,5 @@
 from __future__ import annotations
-import ctypes, functools
+import ctypes, functools, threading
 from typing import Tuple
 from tinygrad.device import Compiled, Compiler, MallocAllocator
 from tinygrad.helpers import DEBUG, cpu_time_execution, cpu_objdump
@@ -7,15 +7,18 @@ from tinygrad.renderer.llvmir import LLVMRenderer
 import llvmlite.binding as llvm
 
 class LLVMCompiler(Compiler):
+  thread_safe = True
   def __init__(self, device:LLVMDevice):
-    self.device = device
+    self.device, self.lock = device, threading.Lock()
     super().__init__("compile_llvm")
   def compile(self, src:str) -> bytes:
     mod = llvm.parse_assembly(src)
     mod.verify()
-    self.device.optimizer.run(mod)
-    if DEBUG >= 5: print(self.device.target_machine.emit_assembly(mod))
-    return self.device.target_machine.emit_object(mod)
+    # the pass manager and target machine are shared, so only parsing runs in parallel with PARALLEL_COMPILE
+    with self.lock:
+      self.device.optimizer.run(mod)
+      if DEBUG >= 5: print(self.device.target_machine.emit_assembly(mod))
+      return self.device.target_machine.emit_object(mod)
 
 class LLVMProgram:
   def __init__(self, device:LLVMDevice, name:str, lib:bytes):
@@ -194,6 +194,7 @@ class PythonRenderer(Renderer):
     return base64.b64encode(pickle.dumps(lops)).decode()
 
 class PythonCompiler(Compiler):
+  thread_safe = True
   def compile(self, src:str) -> bytes: return base64.b64decode(src)
 
 class PythonAllocator(Allocator):
@@ -2,12 +2,12 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from typing import Tuple, List, Optional, Dict, Set, Iterable, cast
-from tinygrad.helpers import merge_dicts, getenv
+from tinygrad.helpers import merge_dicts, getenv, Interned
 from tinygrad.shape.symbolic import Variable, MulNode, Node, SumNode, NumNode, sint
 from tinygrad.shape.view import View, strides_for_shape
 
-@dataclass(frozen=True)
-class ShapeTracker:
+@dataclass(frozen=True, eq=False)
+class ShapeTracker(metaclass=Interned):
   views: Tuple[View, ...]
 
   def __add__(self, st:ShapeTracker) -> ShapeTracker:
@@ -1,7 +1,6 @@
 from __future__ import annotations
-import functools
 from math import gcd
-from tinygrad.helpers import partition
+from tinygrad.helpers import partition, bounded_cache
 from typing import List, Dict, Callable, Tuple, Type, Union, Optional, Any, Set, Mapping
 
 # NOTE: Python has different behavior for negative mod and floor div than c
@@ -20,8 +19,11 @@ class Node:
   def substitute(self, var_vals: Mapping[Variable, Union[NumNode, Variable]]) -> Node: raise RuntimeError(self.__class__.__name__)
   def unbind(self) -> Tuple[Node, Optional[int]]: return self.substitute({v: v.unbind()[0] for v in self.vars() if v.val is not None}), None
 
-  @functools.cached_property
-  def key(self) -> str: return self.render(ctx="DEBUG")
+  # the DEBUG render, built from the cached keys of the children. NOTE: not a cached_property, its lock is slow before python 3.12
+  @property
+  def key(self) -> str:
+    if (ret:=self.__dict__.get("_key")) is None: ret = self.__dict__["_key"] = render_key[type(self)](self)
+    return ret
   def __repr__(self): return self.render(ctx="REPR")
   def __str__(self): return "<"+self.key+">"
   def __hash__(self): return hash(self.key)
@@ -86,12 +88,14 @@ class Node:
     if not nodes: return NumNode(0)
     if len(nodes) == 1: return nodes[0]
 
+    # the linear form, a coefficient for each term and a constant
     mul_groups: Dict[Node, int] = {}
     num_node_sum = 0
-    for node in SumNode(nodes).flat_components:
-      if node.__class__ is NumNode: num_node_sum += node.b
-      elif node.__class__ is MulNode: mul_groups[node.a] = mul_groups.get(node.a, 0) + node.b
-      else: mul_groups[node] = mul_groups.get(node, 0) + 1
+    for x in nodes:
+      for node in (x.flat_components if x.__class__ is SumNode else (x,)):
+        if node.__class__ is NumNode: num_node_sum += node.b
+        elif node.__class__ is MulNode: mul_groups[node.a] = mul_groups.get(node.a, 0) + node.b
+        else: mul_groups[node] = mul_groups.get(node, 0) + 1
     new_nodes = [MulNode(a, b_sum) if b_sum != 1 else a for a, b_sum in mul_groups.items() if b_sum != 0]
     if num_node_sum: new_nodes.append(NumNode(num_node_sum))
     return create_node(SumNode(new_nodes)) if len(new_nodes) > 1 else new_nodes[0] if len(new_nodes) == 1 else NumNode(0)
@@ -126,7 +130,9 @@ class Variable(Node):
     return self._val
   def bind(self, val):
     assert self._val is None and self.min<=val<=self.max, f"cannot bind {val} to {self}"
+    # the key has the value
     self._val = val
+    self.__dict__.pop("_key", None)
     return self
   def unbind(self) -> Tuple[Variable, int]:
     assert self.val is not None, f"cannot unbind {self}"
@@ -237,9 +243,9 @@ class RedNode(Node):
 
 class SumNode(RedNode):
   def get_bounds(self) -> Tuple[int, sint]: return sum([x.min for x in self.nodes]), sum([x.max for x in self.nodes])
-  @functools.lru_cache(maxsize=None)  # pylint: disable=method-cache-max-size-none
+  @bounded_cache("SumNode.__mul__")
   def __mul__(self, b: Union[Node, int]): return Node.sum([x*b for x in self.nodes]) # distribute mul into sum
-  @functools.lru_cache(maxsize=None)  # pylint: disable=method-cache-max-size-none
+  @bounded_cache("SumNode.__floordiv__")
   def __floordiv__(self, b: Union[Node, sint], factoring_allowed=True):
     if self == b: return NumNode(1)
     fully_divided: List[Node] = []
@@ -274,7 +280,7 @@ class SumNode(RedNode):
     if divisor > 1: return Node.sum(fully_divided) + Node.sum(rest).__floordiv__(divisor) // (b//divisor)
     return Node.sum(fully_divided) + Node.__floordiv__(Node.sum(rest), b)
 
-  @functools.lru_cache(maxsize=None)  # pylint: disable=method-cache-max-size-none
+  @bounded_cache("SumNode.__mod__")
   def __mod__(self, b: Union[Node, int]):
     if self == b: return NumNode(0)
     if isinstance(b, Node) and (b - self).min > 0: return self # b - self simplifies the node
@@ -287,7 +293,10 @@ class SumNode(RedNode):
   # recursively expand sumnode components
   # TODO: can remove this if there's no SumNode inside SumNode
   @property
-  def flat_components(self): return [y for x in self.nodes for y in (x.flat_components if isinstance(x, SumNode) else [x])]
+  def flat_components(self) -> List[Node]:
+    if (ret:=self.__dict__.get("_flat_components")) is None:
+      ret = self.__dict__["_flat_components"] = [y for x in self.nodes for y in (x.flat_components if isinstance(x, SumNode) else [x])]
+    return ret
 
 class AndNode(RedNode):
   def get_bounds(self) -> Tuple[int, sint]: return min([x.min for x in self.nodes]), max([x.max for x in self.nodes])
@@ -326,3 +335,21 @@ render_python: Dict[Type, Callable[..., str]] = {
   SumNode: lambda self,ops,ctx: f"({'+'.join(sorted([x.render(ops,ctx) for x in self.nodes]))})",
   AndNode: lambda self,ops,ctx: f"({' and '.join(sorted([x.render(ops,ctx) for x in self.nodes]))})",
 }
+
+def sym_key(a: Union[Node, int]) -> str: return str(a) if isinstance(a, int) else a.key
+def key_mulnode(node:MulNode) -> str:
+  if isinstance(node.a,Variable) and isinstance(node.b,Variable) and node.a.expr and node.b.expr and node.b.expr < node.a.expr:
+    return f"({node.b.key}*{node.a.key})"
+  return f"({node.a.key}*{sym_key(node.b)})"
+
+# matches render_python with ctx="DEBUG"
+render_key: Dict[Type, Callable[..., str]] = {
+  Variable: lambda self: f"{self.expr}[{self.min}-{self.max}{'='+str(self._val) if self._val is not None else ''}]",
+  NumNode: lambda self: f"{self.b}",
+  MulNode: key_mulnode,
+  DivNode: lambda self: f"({self.a.key}//{self.b})",
+  ModNode: lambda self: f"({self.a.key}%{self.b})",
+  LtNode: lambda self: f"({self.a.key}<{sym_key(self.b)})",
+  SumNode: lambda self: f"({'+'.join(sorted([x.key for x in self.nodes]))})",
+  AndNode: lambda self: f"({' and '.join(sorted([x.key for x in self.nodes]))})",
+}